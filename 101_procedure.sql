@@ -28,63 +28,47 @@ BEGIN
     balance_out_rub, balance_out_val, balance_out_total
   )
 
-  WITH account_info AS (
+  -- атрибуты счетов берутся из ds.md_account_ledger (обновляется при загрузке справочников)
+  -- для версий счета и балансового счета, актуальных на дату остатка или оборота
+  WITH
+  -- входящие и исходящие остатки за один проход по остаткам
+  balances AS (
     SELECT
-      a.account_rk,
-      SUBSTRING(a.account_number FROM 1 FOR 5) AS ledger_account,  -- первые 5 символов
-      la.chapter,
-      a.char_type AS characteristic,
-      CASE WHEN a.currency_code IN ('810', '643') THEN 1 ELSE 0 END AS is_rub
-    FROM ds.md_account_d a
-    LEFT JOIN ds.md_ledger_account_s la ON SUBSTRING(a.account_number FROM 1 FOR 5)::INTEGER = la.ledger_account
-  ),
-
-  -- входящие остатки на день перед началом периода
-  start_balances AS (
-    SELECT
-      ai.ledger_account,
-      ai.chapter,
-      ai.characteristic,
-      SUM(CASE WHEN ai.is_rub = 1 THEN b.balance_out_rub ELSE 0 END) AS balance_in_rub,
-      SUM(CASE WHEN ai.is_rub = 0 THEN b.balance_out_rub ELSE 0 END) AS balance_in_val,
-      SUM(b.balance_out_rub) AS balance_in_total
+      al.ledger_account,
+      al.chapter,
+      al.characteristic,
+      BOOL_OR(b.on_date = l_from_date - 1) AS has_balance_in,
+      BOOL_OR(b.on_date = l_to_date) AS has_balance_out,
+      SUM(CASE WHEN al.is_rub = 1 THEN b.balance_out_rub ELSE 0 END) FILTER (WHERE b.on_date = l_from_date - 1) AS balance_in_rub,
+      SUM(CASE WHEN al.is_rub = 0 THEN b.balance_out_rub ELSE 0 END) FILTER (WHERE b.on_date = l_from_date - 1) AS balance_in_val,
+      SUM(b.balance_out_rub) FILTER (WHERE b.on_date = l_from_date - 1) AS balance_in_total,
+      SUM(CASE WHEN al.is_rub = 1 THEN b.balance_out_rub ELSE 0 END) FILTER (WHERE b.on_date = l_to_date) AS balance_out_rub,
+      SUM(CASE WHEN al.is_rub = 0 THEN b.balance_out_rub ELSE 0 END) FILTER (WHERE b.on_date = l_to_date) AS balance_out_val,
+      SUM(b.balance_out_rub) FILTER (WHERE b.on_date = l_to_date) AS balance_out_total
     FROM dm.dm_account_balance_f b
-    JOIN account_info ai ON b.account_rk = ai.account_rk
-    WHERE b.on_date = l_from_date - INTERVAL '1 DAY'
-    GROUP BY ai.ledger_account, ai.chapter, ai.characteristic
+    JOIN ds.md_account_ledger al ON b.account_rk = al.account_rk
+      AND b.on_date BETWEEN al.data_actual_date AND al.data_actual_end_date
+    WHERE b.on_date IN (l_from_date - 1, l_to_date)
+    GROUP BY al.ledger_account, al.chapter, al.characteristic
   ),
 
   -- обороты за отчетный период
   turnovers AS (
     SELECT
-      ai.ledger_account,
-      ai.chapter,
-      ai.characteristic,
-      SUM(CASE WHEN ai.is_rub = 1 THEN t.debet_amount_rub ELSE 0 END) AS turn_deb_rub,
-      SUM(CASE WHEN ai.is_rub = 0 THEN t.debet_amount_rub ELSE 0 END) AS turn_deb_val,
+      al.ledger_account,
+      al.chapter,
+      al.characteristic,
+      SUM(CASE WHEN al.is_rub = 1 THEN t.debet_amount_rub ELSE 0 END) AS turn_deb_rub,
+      SUM(CASE WHEN al.is_rub = 0 THEN t.debet_amount_rub ELSE 0 END) AS turn_deb_val,
       SUM(t.debet_amount_rub) AS turn_deb_total,
-      SUM(CASE WHEN ai.is_rub = 1 THEN t.credit_amount_rub ELSE 0 END) AS turn_cre_rub,
-      SUM(CASE WHEN ai.is_rub = 0 THEN t.credit_amount_rub ELSE 0 END) AS turn_cre_val,
+      SUM(CASE WHEN al.is_rub = 1 THEN t.credit_amount_rub ELSE 0 END) AS turn_cre_rub,
+      SUM(CASE WHEN al.is_rub = 0 THEN t.credit_amount_rub ELSE 0 END) AS turn_cre_val,
       SUM(t.credit_amount_rub) AS turn_cre_total
     FROM dm.dm_account_turnover_f t
-    JOIN account_info ai ON t.account_rk = ai.account_rk
+    JOIN ds.md_account_ledger al ON t.account_rk = al.account_rk
+      AND t.on_date BETWEEN al.data_actual_date AND al.data_actual_end_date
     WHERE t.on_date BETWEEN l_from_date AND l_to_date
-    GROUP BY ai.ledger_account, ai.chapter, ai.characteristic
-  ),
-
-  --остатки на конец отчетного периода
-  end_balances AS (
-    SELECT
-      ai.ledger_account,
-      ai.chapter,
-      ai.characteristic,
-      SUM(CASE WHEN ai.is_rub = 1 THEN b.balance_out_rub ELSE 0 END) AS balance_out_rub,
-      SUM(CASE WHEN ai.is_rub = 0 THEN b.balance_out_rub ELSE 0 END) AS balance_out_val,
-      SUM(b.balance_out_rub) AS balance_out_total
-    FROM dm.dm_account_balance_f b
-    JOIN account_info ai ON b.account_rk = ai.account_rk
-    WHERE b.on_date = l_to_date
-    GROUP BY ai.ledger_account, ai.chapter, ai.characteristic
+    GROUP BY al.ledger_account, al.chapter, al.characteristic
   )
 
     SELECT
@@ -93,26 +77,32 @@ BEGIN
           sb.chapter,
           sb.ledger_account,
           sb.characteristic,
-          balance_in_rub,
-          balance_in_val,
-          balance_in_total,
+          sb.balance_in_rub,
+          sb.balance_in_val,
+          sb.balance_in_total,
 
-          turn_deb_rub,
-          turn_deb_val,
-          turn_deb_total,
-          turn_cre_rub,
-          turn_cre_val,
-          turn_cre_total,
+          t.turn_deb_rub,
+          t.turn_deb_val,
+          t.turn_deb_total,
+          t.turn_cre_rub,
+          t.turn_cre_val,
+          t.turn_cre_total,
 
-          balance_out_rub,
-          balance_out_val,
-          balance_out_total
+          eb.balance_out_rub,
+          eb.balance_out_val,
+          eb.balance_out_total
 
-    FROM start_balances sb JOIN end_balances eb ON sb.ledger_account = eb.ledger_account
+    -- группы с входящими и с исходящими остатками соединяются по балансовому счету,
+    -- как прежние start_balances и end_balances
+    FROM balances sb
+    JOIN balances eb ON sb.ledger_account = eb.ledger_account AND eb.has_balance_out
     LEFT JOIN turnovers t ON sb.ledger_account = t.ledger_account
+    WHERE sb.has_balance_in
   ;
+  GET DIAGNOSTICS l_records_processed = ROW_COUNT;
+
   INSERT INTO LOGS.ETL_LOGS(process_name, start_time, end_time, status, rows_processed)
-  VALUES ('FILL_F101_ROUND_F for '||i_OnDate, l_start_time, CLOCK_TIMESTAMP(), 'ok', 0);
+  VALUES ('FILL_F101_ROUND_F for '||i_OnDate, l_start_time, CLOCK_TIMESTAMP(), 'ok', l_records_processed);
   COMMIT;
 END;
 $$;
@@ -0,0 +1,125 @@
+import os
+import time
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2 import sql, pool
+from config import DB_CONFIG, setup_logging
+
+logger = setup_logging()
+
+
+def date_range(date_from, date_to):
+    days = (date_to - date_from).days
+    return [date_from + timedelta(days=offset) for offset in range(days + 1)]
+
+
+def report_dates(date_from, date_to):
+    # Форма 101 за месяц строится на первое число следующего месяца
+    dates = []
+    month = date_from.replace(day=1)
+    while month <= date_to:
+        month = (month + timedelta(days=32)).replace(day=1)
+        dates.append(month)
+    return dates
+
+
+def call_procedure(conn, procedure, on_date, schema='ds'):
+    started = time.perf_counter()
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("CALL {}(%s)").format(sql.Identifier(schema, procedure)), (on_date,))
+    elapsed = time.perf_counter() - started
+    logger.info(f"{procedure} за {on_date}: {elapsed:.2f} с")
+    return elapsed
+
+
+class ProcedureRunner:
+    # Процедуры сами выполняют COMMIT, поэтому соединения работают в autocommit
+    def __init__(self, db_config, max_connections):
+        self.pool = pool.ThreadedConnectionPool(1, max_connections, **db_config)
+
+    def __call__(self, procedure, on_date, schema='ds'):
+        conn = self.pool.getconn()
+        try:
+            conn.autocommit = True
+            return call_procedure(conn, procedure, on_date, schema)
+        finally:
+            self.pool.putconn(conn, close=bool(conn.closed))
+
+    def close(self):
+        self.pool.closeall()
+
+
+def fill_accounts(runner, dates, jobs):
+    # Обороты за разные дни независимы и считаются параллельно,
+    # остатки зависят от предыдущего дня и считаются строго по порядку
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        turnovers = {
+            on_date: executor.submit(runner, 'p_fill_account_turnover', on_date)
+            for on_date in dates
+        }
+        for on_date in dates:
+            turnovers[on_date].result()
+            runner('p_fill_account_balance', on_date)
+    logger.info(f"Обороты и остатки за {len(dates)} дней рассчитаны "
+                f"за {time.perf_counter() - started:.2f} с")
+
+
+def fill_f101(runner, on_dates, jobs):
+    # Каждый месяц считается отдельным вызовом в своей транзакции,
+    # месяцы не пересекаются и строятся параллельно
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(runner, 'fill_f101_round_f', on_date, 'dm') for on_date in on_dates]
+        for future in futures:
+            future.result()
+    logger.info(f"Форма 101 за {len(on_dates)} месяцев рассчитана "
+                f"за {time.perf_counter() - started:.2f} с")
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Расчет оборотов и остатков за период')
+    parser.add_argument('date_from', type=parse_date, help='первая дата, YYYY-MM-DD')
+    parser.add_argument('date_to', type=parse_date, help='последняя дата, YYYY-MM-DD')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='количество дней (месяцев для формы 101), '
+                             'которые считаются параллельно')
+    parser.add_argument('--f101', action='store_true',
+                        help='рассчитать форму 101 за все месяцы периода')
+    parser.add_argument('--skip-accounts', action='store_true',
+                        help='не пересчитывать обороты и остатки')
+    args = parser.parse_args(argv)
+    if args.date_from > args.date_to:
+        parser.error('date_from не может быть больше date_to')
+    if args.jobs < 1:
+        parser.error('--jobs должен быть не меньше 1')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    dates = date_range(args.date_from, args.date_to)
+    logger.info(f"Расчет витрин за период {args.date_from} - {args.date_to}")
+
+    # Плюс одно соединение для последовательного расчета остатков
+    runner = ProcedureRunner(DB_CONFIG, args.jobs + 1)
+    try:
+        if not args.skip_accounts:
+            fill_accounts(runner, dates, args.jobs)
+        if args.f101:
+            fill_f101(runner, report_dates(args.date_from, args.date_to), args.jobs)
+    finally:
+        runner.close()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        logger.critical(f"Завершение работы с ошибкой: {str(e)}")
+        exit(1)
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import psycopg2
+from psycopg2 import sql
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import etl
+import backfill
+import config
+from csv_export_import import CSVManager, table_identifier
+
+logger = etl.logger
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def count_rows(table_name, where=None, params=None):
+    conn = psycopg2.connect(**config.DB_CONFIG)
+    try:
+        with conn.cursor() as cursor:
+            query = sql.SQL("SELECT COUNT(*) FROM {}").format(table_identifier(table_name))
+            if where:
+                query = sql.SQL("{} WHERE {}").format(query, sql.SQL(where))
+            cursor.execute(query, params)
+            return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def bench_load(data_dir, table_name, method, engine):
+    table_info = etl.create_table_mapping()[table_name]
+    conn = psycopg2.connect(**etl.DB_CONFIG)
+    try:
+        started = time.perf_counter()
+        rows = etl.load_table(conn, table_name, os.path.join(data_dir, f"{table_name}.csv"),
+                              table_info, method=method, engine=engine, force=True)
+        return rows, time.perf_counter() - started
+    finally:
+        conn.close()
+
+
+def bench_export_import(table_name, method):
+    manager = CSVManager(config.DB_CONFIG)
+    copied_table = f"{table_name}_bench"
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_file = os.path.join(temp_dir, 'export.csv')
+        started = time.perf_counter()
+        if not manager.export_to_csv(table_name, csv_file):
+            raise etl.ETLError(f"Ошибка экспорта {table_name}")
+        exported = time.perf_counter()
+        if not manager.create_table_copy(table_name, copied_table):
+            raise etl.ETLError(f"Ошибка создания копии {table_name}")
+        imported_started = time.perf_counter()
+        if not manager.import_from_csv(csv_file, copied_table, method=method):
+            raise etl.ETLError(f"Ошибка импорта в {copied_table}")
+        finished = time.perf_counter()
+    logger.info(f"Экспорт {table_name}: {exported - started:.2f} с, "
+                f"импорт: {finished - imported_started:.2f} с")
+    return count_rows(copied_table), (exported - started) + (finished - imported_started)
+
+
+def bench_accounts(date_from, date_to, jobs):
+    dates = backfill.date_range(date_from, date_to)
+    runner = backfill.ProcedureRunner(config.DB_CONFIG, jobs + 1)
+    try:
+        started = time.perf_counter()
+        backfill.fill_accounts(runner, dates, jobs)
+        seconds = time.perf_counter() - started
+    finally:
+        runner.close()
+    rows = count_rows('dm.dm_account_balance_f', 'on_date BETWEEN %s AND %s', (date_from, date_to))
+    return rows, seconds
+
+
+def bench_f101(on_date):
+    conn = psycopg2.connect(**config.DB_CONFIG)
+    try:
+        conn.autocommit = True
+        started = time.perf_counter()
+        with conn.cursor() as cursor:
+            cursor.execute("CALL dm.fill_f101_round_f(%s)", (on_date,))
+        seconds = time.perf_counter() - started
+    finally:
+        conn.close()
+    return count_rows('dm.dm_f101_round_f'), seconds
+
+
+BENCHMARKS = {
+    'load': bench_load,
+    'export_import': bench_export_import,
+    'accounts': bench_accounts,
+    'f101': bench_f101
+}
+
+
+def run_case(case):
+    rows, seconds = BENCHMARKS[case['benchmark']](**case['params'])
+    return {
+        'benchmark': case['benchmark'],
+        'params': {key: str(value) for key, value in case['params'].items()},
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(rows / seconds, 1) if rows and seconds > 0 else None,
+        'peak_rss_kb': peak_rss_kb()
+    }
+
+
+def run_isolated(case):
+    # Каждый замер в отдельном процессе, чтобы пиковая память относилась только к нему
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context,
+                             initializer=config.setup_worker_logging,
+                             initargs=(config.worker_log_queue(),)) as executor:
+        return executor.submit(run_case, case).result()
+
+
+def build_cases(args):
+    cases = []
+    for table_name in args.tables:
+        for method in args.methods:
+            for engine in args.engines:
+                if engine == 'numpy' and (etl.np is None or method != 'copy'):
+                    continue
+                cases.append({'benchmark': 'load', 'params': {
+                    'data_dir': args.data_dir, 'table_name': table_name,
+                    'method': method, 'engine': engine
+                }})
+    for table_name in args.export_tables:
+        for method in ('copy', 'insert'):
+            cases.append({'benchmark': 'export_import', 'params': {
+                'table_name': table_name, 'method': method
+            }})
+    if args.date_from and args.date_to:
+        cases.append({'benchmark': 'accounts', 'params': {
+            'date_from': args.date_from, 'date_to': args.date_to, 'jobs': args.jobs
+        }})
+    if args.f101_date:
+        cases.append({'benchmark': 'f101', 'params': {'on_date': args.f101_date}})
+    return cases
+
+
+def parse_args(argv=None):
+    table_names = list(etl.create_table_mapping())
+    parser = argparse.ArgumentParser(description='Замеры производительности ETL')
+    parser.add_argument('--data-dir', default=etl.DATA_DIR, help='каталог с CSV файлами')
+    parser.add_argument('--tables', nargs='*', default=table_names, choices=table_names,
+                        help='таблицы для замера load_table')
+    parser.add_argument('--methods', nargs='*', default=list(etl.LOAD_METHODS),
+                        choices=etl.LOAD_METHODS)
+    parser.add_argument('--engines', nargs='*', default=list(etl.LOAD_ENGINES),
+                        choices=etl.LOAD_ENGINES)
+    parser.add_argument('--export-tables', nargs='*', default=['dm.dm_f101_round_f'],
+                        help='таблицы для замера экспорта и импорта CSV')
+    parser.add_argument('--date-from', type=backfill.parse_date,
+                        help='начало периода для p_fill_account_*, YYYY-MM-DD')
+    parser.add_argument('--date-to', type=backfill.parse_date,
+                        help='конец периода для p_fill_account_*, YYYY-MM-DD')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--f101-date', type=backfill.parse_date,
+                        help='дата для dm.fill_f101_round_f (первое число месяца)')
+    parser.add_argument('--label', default='', help='метка версии в отчете')
+    parser.add_argument('--output', help='файл для JSON отчета (по умолчанию stdout)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = {
+        'label': args.label,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'results': []
+    }
+    for case in build_cases(args):
+        logger.info(f"Замер {case['benchmark']}: {case['params']}")
+        report['results'].append(run_isolated(case))
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        logger.info(f"Отчет сохранен в {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
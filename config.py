@@ -11,16 +11,63 @@ DB_CONFIG = {
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 
+import atexit
 import logging
+import multiprocessing
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = 'etl_process.log'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+_log_listener = None
+_worker_log_queue = None
+
 
 def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('etl_process.log', encoding='utf-8'),
+    # Записи ставятся в очередь, в файл (с ротацией по размеру) и в консоль
+    # их пишет фоновый поток, поэтому логирование не блокирует загрузку.
+    # Файл открывает только основной процесс: дочерние процессы передают записи
+    # ему через worker_log_queue (см. setup_worker_logging)
+    global _log_listener
+    if _log_listener is None and multiprocessing.parent_process() is None:
+        log_queue = queue.SimpleQueue()
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        handlers = [
+            RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                encoding='utf-8'),
             logging.StreamHandler(sys.stdout)
         ]
-    )
-    return logging.getLogger(__name__)
\ No newline at end of file
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _log_listener.start()
+        # При завершении процесса оставшиеся записи дописываются из очереди
+        atexit.register(_log_listener.stop)
+
+        root = logging.getLogger()
+        root.setLevel(logging.INFO)
+        root.addHandler(QueueHandler(log_queue))
+    return logging.getLogger(__name__)
+
+
+def worker_log_queue():
+    # Очередь для записей дочерних процессов, ее читает слушатель с теми же обработчиками
+    global _worker_log_queue
+    if _worker_log_queue is None:
+        _worker_log_queue = multiprocessing.get_context('spawn').Queue()
+        listener = QueueListener(_worker_log_queue, *_log_listener.handlers,
+                                 respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
+    return _worker_log_queue
+
+
+def setup_worker_logging(log_queue):
+    # initializer пула процессов: записи уходят в очередь основного процесса
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.handlers[:] = [QueueHandler(log_queue)]
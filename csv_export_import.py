@@ -1,60 +1,152 @@
+import os
+import io
 import csv
+import hashlib
+import weakref
+from itertools import islice
 import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import execute_batch
 from config import DB_CONFIG, setup_logging
 
 logger = setup_logging()
 
+# Способы экспорта: COPY ... TO STDOUT или именованный (серверный) курсор
+EXPORT_METHODS = ('copy', 'cursor')
+EXPORT_ITERSIZE = 10000
+
+# Способы импорта: COPY порциями (потоково) или INSERT всего файла одной транзакцией
+IMPORT_METHODS = ('copy', 'insert')
+IMPORT_CHUNK_SIZE = 10000
+INSERT_PAGE_SIZE = 1000
+
+
+# Подготовленные запросы живут на соединении, а не на менеджере: соединения пула
+# переходят между менеджерами вместе с уже выполненными PREPARE
+_prepared_statements = weakref.WeakKeyDictionary()
+
+
+def table_identifier(table_name):
+    return sql.Identifier(*table_name.split('.'))
+
 
 class CSVManager:
-    def __init__(self, db_config):
+    # Без сессии каждый метод открывает и закрывает свое соединение.
+    # Внутри "with manager:" одно соединение (из пула, если он передан)
+    # используется всеми вызовами, подготовленные запросы сохраняются между ними
+    def __init__(self, db_config, connection_pool=None):
         self.db_config = db_config
+        self.connection_pool = connection_pool
+        self.connection = None
+        self.session_depth = 0
+
+    def __enter__(self):
+        if self.session_depth == 0:
+            self.open_connection()
+        self.session_depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.session_depth -= 1
+        if self.session_depth == 0:
+            self.close_connection()
+
+    def open_connection(self):
+        if self.connection_pool is not None:
+            self.connection = self.connection_pool.getconn()
+        else:
+            self.connection = psycopg2.connect(**self.db_config)
+        logger.info("Успешное подключение к базе данных")
+
+    def close_connection(self):
+        if self.connection is None:
+            return
+        if self.connection_pool is not None:
+            if not self.connection.closed:
+                self.connection.rollback()
+            self.connection_pool.putconn(self.connection, close=bool(self.connection.closed))
+        else:
+            self.connection.close()
+            _prepared_statements.pop(self.connection, None)
         self.connection = None
+        logger.info("Отключение от базы данных")
 
     def connect(self):
+        if self.session_depth:
+            return True
         try:
-            self.connection = psycopg2.connect(**self.db_config)
-            logger.info("Успешное подключение к базе данных")
+            self.open_connection()
             return True
         except Exception as e:
             logger.error(f"Ошибка подключения к БД: {str(e)}")
             return False
 
     def disconnect(self):
-        if self.connection:
-            self.connection.close()
-            logger.info("Отключение от базы данных")
+        if self.session_depth:
+            # Соединение остается открытым, завершается только текущая транзакция
+            if not self.connection.closed:
+                self.connection.rollback()
+            return
+        self.close_connection()
+
+    def prepare(self, cursor, name, statement):
+        # PREPARE не откатывается вместе с транзакцией и живет до закрытия соединения
+        prepared = _prepared_statements.setdefault(self.connection, set())
+        if name not in prepared:
+            cursor.execute(sql.SQL("PREPARE {} AS {}").format(sql.Identifier(name), statement))
+            prepared.add(name)
+        return name
+
+    def table_columns(self, cursor, table_name):
+        schema, _, table = table_name.rpartition('.')
+        name = self.prepare(cursor, 'csv_table_columns', sql.SQL("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = COALESCE(NULLIF($1, ''), current_schema()) AND table_name = $2
+            ORDER BY ordinal_position
+        """))
+        cursor.execute(sql.SQL("EXECUTE {} (%s, %s)").format(sql.Identifier(name)),
+                       (schema.lower(), table.lower()))
+        return [row[0] for row in cursor.fetchall()]
+
+    def export_to_csv(self, table_name, output_file, method='copy', itersize=EXPORT_ITERSIZE):
+        if method not in EXPORT_METHODS:
+            logger.error(f"Неизвестный способ экспорта: {method}")
+            return False
 
-    def export_to_csv(self, table_name, output_file):
         try:
             if not self.connect():
                 return False
 
             logger.info(f"Начало экспорта данных из таблицы {table_name}")
 
-            with self.connection.cursor() as cursor:
-                cursor.execute(f"SELECT * FROM {table_name}")
-                rows = cursor.fetchall()
-
-                cursor.execute(f"""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = '{table_name.split('.')[-1]}' 
-                    AND table_schema = '{table_name.split('.')[0]}'
-                    ORDER BY ordinal_position
-                """)
-                columns = [row[0] for row in cursor.fetchall()]
-
-                with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+            with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+                if method == 'copy':
+                    # Данные пишутся в файл по мере получения от сервера
+                    with self.connection.cursor() as cursor:
+                        cursor.copy_expert(
+                            sql.SQL("COPY (SELECT * FROM {}) TO STDOUT WITH (FORMAT csv, HEADER true)")
+                            .format(table_identifier(table_name)),
+                            csvfile
+                        )
+                        rows_exported = cursor.rowcount
+                else:
                     writer = csv.writer(csvfile, delimiter=',', quotechar='"',
                                         quoting=csv.QUOTE_MINIMAL)
-
-                    writer.writerow(columns)
-
-                    for row in rows:
-                        writer.writerow(row)
-
-                logger.info(f"Успешно экспортировано {len(rows)} строк в файл {output_file}")
-                return True
+                    with self.connection.cursor(name='csv_export') as cursor:
+                        cursor.itersize = itersize
+                        cursor.execute(sql.SQL("SELECT * FROM {}").format(table_identifier(table_name)))
+
+                        rows_exported = 0
+                        for row in cursor:
+                            if rows_exported == 0:
+                                writer.writerow([column[0] for column in cursor.description])
+                            writer.writerow(row)
+                            rows_exported += 1
+                        if rows_exported == 0 and cursor.description:
+                            writer.writerow([column[0] for column in cursor.description])
+
+            logger.info(f"Успешно экспортировано {rows_exported} строк в файл {output_file}")
+            return True
 
         except Exception as e:
             logger.error(f"Ошибка при экспорте данных: {str(e)}")
@@ -70,12 +162,11 @@ class CSVManager:
             logger.info(f"Создание копии таблицы {original_table} -> {new_table}")
 
             with self.connection.cursor() as cursor:
-                cursor.execute(f"""
-                    CREATE TABLE IF NOT EXISTS {new_table} 
-                    (LIKE {original_table} INCLUDING ALL)
-                """)
+                cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} (LIKE {} INCLUDING ALL)").format(
+                    table_identifier(new_table), table_identifier(original_table)
+                ))
 
-                cursor.execute(f"TRUNCATE TABLE {new_table}")
+                cursor.execute(sql.SQL("TRUNCATE TABLE {}").format(table_identifier(new_table)))
 
                 self.connection.commit()
                 logger.info(f"Таблица {new_table} успешно создана")
@@ -88,7 +179,105 @@ class CSVManager:
         finally:
             self.disconnect()
 
-    def import_from_csv(self, csv_file, target_table):
+    def clone_table(self, original_table, new_table, date_column='from_date',
+                    date_from=None, date_to=None):
+        # Данные копируются внутри сервера, без передачи через клиента
+        try:
+            if not self.connect():
+                return False
+
+            logger.info(f"Клонирование таблицы {original_table} -> {new_table}")
+
+            conditions = []
+            params = []
+            if date_from is not None:
+                conditions.append(sql.SQL("{} >= %s").format(sql.Identifier(date_column)))
+                params.append(date_from)
+            if date_to is not None:
+                conditions.append(sql.SQL("{} <= %s").format(sql.Identifier(date_column)))
+                params.append(date_to)
+            query = sql.SQL("INSERT INTO {} SELECT * FROM {}").format(
+                table_identifier(new_table), table_identifier(original_table)
+            )
+            if conditions:
+                query = sql.SQL("{} WHERE {}").format(query, sql.SQL(' AND ').join(conditions))
+
+            with self.connection.cursor() as cursor:
+                cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} (LIKE {} INCLUDING ALL)").format(
+                    table_identifier(new_table), table_identifier(original_table)
+                ))
+                cursor.execute(sql.SQL("TRUNCATE TABLE {}").format(table_identifier(new_table)))
+                cursor.execute(query, params)
+                rows_copied = cursor.rowcount
+                self.connection.commit()
+
+            logger.info(f"Скопировано {rows_copied} строк в таблицу {new_table}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Ошибка при клонировании таблицы: {str(e)}")
+            if self.connection:
+                self.connection.rollback()
+            return False
+        finally:
+            self.disconnect()
+
+    def snapshot_table(self, table_name, snapshot_file):
+        # Двоичный формат COPY не требует разбора и форматирования значений
+        try:
+            if not self.connect():
+                return False
+
+            with open(snapshot_file, 'wb') as f, self.connection.cursor() as cursor:
+                cursor.copy_expert(sql.SQL("COPY {} TO STDOUT WITH (FORMAT binary)").format(
+                    table_identifier(table_name)
+                ), f)
+                rows_saved = cursor.rowcount
+
+            logger.info(f"Снимок таблицы {table_name} сохранен в {snapshot_file}: {rows_saved} строк")
+            return True
+
+        except Exception as e:
+            logger.error(f"Ошибка при создании снимка таблицы: {str(e)}")
+            return False
+        finally:
+            self.disconnect()
+
+    def restore_table(self, snapshot_file, target_table, truncate=True):
+        # Колонки и их типы в целевой таблице должны совпадать с таблицей снимка
+        try:
+            if not self.connect():
+                return False
+
+            with open(snapshot_file, 'rb') as f, self.connection.cursor() as cursor:
+                if truncate:
+                    cursor.execute(sql.SQL("TRUNCATE TABLE {}").format(table_identifier(target_table)))
+                cursor.copy_expert(sql.SQL("COPY {} FROM STDIN WITH (FORMAT binary)").format(
+                    table_identifier(target_table)
+                ), f)
+                rows_restored = cursor.rowcount
+                self.connection.commit()
+
+            logger.info(f"Таблица {target_table} восстановлена из {snapshot_file}: "
+                        f"{rows_restored} строк")
+            return True
+
+        except Exception as e:
+            logger.error(f"Ошибка при восстановлении таблицы: {str(e)}")
+            if self.connection:
+                self.connection.rollback()
+            return False
+        finally:
+            self.disconnect()
+
+    def import_from_csv(self, csv_file, target_table, method='copy',
+                        chunk_size=IMPORT_CHUNK_SIZE, commit_every=1):
+        if method not in IMPORT_METHODS:
+            logger.error(f"Неизвестный способ импорта: {method}")
+            return False
+        if method == 'copy':
+            return self._import_from_csv_copy(csv_file, target_table, chunk_size, commit_every)
+
         try:
             logger.info(f"Начало импорта данных из {csv_file} в таблицу {target_table}")
 
@@ -105,15 +294,23 @@ class CSVManager:
                 return False
 
             with self.connection.cursor() as cursor:
-                placeholders = ', '.join(['%s'] * len(columns))
-                columns_str = ', '.join([f'"{col}"' for col in columns])
-
-                query = f"""
-                    INSERT INTO {target_table} ({columns_str})
-                    VALUES ({placeholders})
-                """
-
-                cursor.executemany(query, rows_to_insert)
+                missing_columns = set(columns) - set(self.table_columns(cursor, target_table))
+                if missing_columns:
+                    raise ValueError(f"В таблице {target_table} нет колонок: {missing_columns}")
+
+                statement_id = hashlib.md5(f"{target_table}:{columns}".encode()).hexdigest()[:12]
+                name = self.prepare(cursor, f"csv_insert_{statement_id}", sql.SQL(
+                    "INSERT INTO {} ({}) VALUES ({})"
+                ).format(
+                    table_identifier(target_table),
+                    sql.SQL(', ').join(map(sql.Identifier, columns)),
+                    sql.SQL(', ').join(sql.SQL(f"${i}") for i in range(1, len(columns) + 1))
+                ))
+                query = sql.SQL("EXECUTE {} ({})").format(
+                    sql.Identifier(name), sql.SQL(', ').join(sql.Placeholder() * len(columns))
+                ).as_string(self.connection)
+
+                execute_batch(cursor, query, rows_to_insert, page_size=INSERT_PAGE_SIZE)
                 self.connection.commit()
 
                 logger.info(f"Успешно импортировано {len(rows_to_insert)} строк в таблицу {target_table}")
@@ -127,13 +324,64 @@ class CSVManager:
         finally:
             self.disconnect()
 
+    def _import_from_csv_copy(self, csv_file, target_table, chunk_size, commit_every):
+        rows_imported = 0
+        try:
+            logger.info(f"Начало потокового импорта данных из {csv_file} в таблицу {target_table}")
+            total_bytes = os.path.getsize(csv_file)
+
+            with open(csv_file, 'r', encoding='utf-8', newline='') as csvfile:
+                reader = csv.reader(csvfile)
+                columns = next(reader)
+
+                if not self.connect():
+                    return False
+
+                query = sql.SQL("COPY {table} ({fields}) FROM STDIN WITH (FORMAT csv)").format(
+                    table=table_identifier(target_table),
+                    fields=sql.SQL(', ').join(map(sql.Identifier, columns))
+                )
+
+                with self.connection.cursor() as cursor:
+                    chunks_loaded = 0
+                    # Пустые ячейки без кавычек COPY интерпретирует как NULL
+                    for chunk in iter(lambda: list(islice(reader, chunk_size)), []):
+                        buffer = io.StringIO()
+                        csv.writer(buffer).writerows(chunk)
+                        buffer.seek(0)
+                        cursor.copy_expert(query, buffer)
+
+                        rows_imported += len(chunk)
+                        chunks_loaded += 1
+                        if chunks_loaded % commit_every == 0:
+                            self.connection.commit()
+                        logger.info(f"Импорт в {target_table}: {rows_imported} строк, "
+                                    f"{csvfile.buffer.tell()} из {total_bytes} байт")
+                    self.connection.commit()
+
+            logger.info(f"Успешно импортировано {rows_imported} строк в таблицу {target_table}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Ошибка при импорте данных после {rows_imported} строк: {str(e)}")
+            if self.connection:
+                self.connection.rollback()
+            return False
+        finally:
+            self.disconnect()
+
 
 def main():
-    manager = CSVManager(DB_CONFIG)
+    with CSVManager(DB_CONFIG) as manager:
+        run_workflow(manager)
+
+
+def run_workflow(manager):
 
     original_table = "dm.dm_f101_round_f"
     copied_table = "dm.dm_f101_round_f_v2"
     csv_file = "dm_f101_round_f_export.csv"
+    snapshot_file = "dm_f101_round_f.snapshot"
 
     logger.info("=" * 50)
     logger.info("ЭКСПОРТ/ИМПОРТ ДАННЫХ В CSV")
@@ -146,18 +394,18 @@ def main():
         logger.error("Ошибка экспорта")
         return
 
-    logger.info("ШАГ 2: Создание копии таблицы")
-    if manager.create_table_copy(original_table, copied_table):
+    logger.info("ШАГ 2: Копирование таблицы на сервере")
+    if manager.clone_table(original_table, copied_table):
         logger.info("Копия таблицы создана успешно")
     else:
-        logger.error(" Ошибка создания копии таблицы")
+        logger.error("Ошибка копирования таблицы")
         return
 
-    logger.info("ШАГ 3: Импорт данных из CSV")
-    if manager.import_from_csv(csv_file, copied_table):
-        logger.info("Импорт завершен успешно")
+    logger.info("ШАГ 3: Двоичный снимок исходной таблицы")
+    if manager.snapshot_table(original_table, snapshot_file):
+        logger.info("Снимок сохранен успешно")
     else:
-        logger.error("Ошибка импорта")
+        logger.error("Ошибка создания снимка")
         return
 
     logger.info("=" * 50)
@@ -167,6 +415,7 @@ def main():
     print(f"\nФайл CSV создан: {csv_file}")
     print("Вы можете изменить данные в CSV и запустить:")
     print("   python modify_csv.py")
+    print(f"Снимок для восстановления таблицы {copied_table}: {snapshot_file}")
 
 
 if __name__ == "__main__":
@@ -1,26 +1,46 @@
 import os
+import io
+import re
+import gzip
+import bz2
+import codecs
+import lzma
+import hashlib
+import mmap
+import uuid
+import multiprocessing
+import queue
+import threading
 import csv
-import logging
-from datetime import datetime
+from datetime import datetime, date
 import time
+import argparse
+import cProfile
+import pstats
+from contextlib import contextmanager, closing
+from itertools import islice, chain
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
 import psycopg2
-from psycopg2 import sql
+from psycopg2 import sql, pool
 import sys
+from config import setup_logging, setup_worker_logging, worker_log_queue
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 # Настройка кодировки для Windows
 sys.stdout.reconfigure(encoding='utf-8')
 sys.stderr.reconfigure(encoding='utf-8')
 
 # Логирование
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('etl_process.log', encoding='utf-8'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-logger = logging.getLogger(__name__)
+logger = setup_logging()
 
 # Конфигурация подключения к БД
 DB_CONFIG = {
@@ -35,6 +55,7 @@ DB_CONFIG = {
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 
+# Файлы могут быть сжаты: .gz, .bz2, .xz, .zst (zstandard)
 CSV_FILES = {
     'ft_balance_f': os.path.join(DATA_DIR, 'ft_balance_f.csv'),
     'ft_posting_f': os.path.join(DATA_DIR, 'ft_posting_f.csv'),
@@ -45,41 +66,241 @@ CSV_FILES = {
 }
 
 
+# Способы записи данных в БД: COPY FROM STDIN (по умолчанию) или построчный INSERT
+LOAD_METHODS = ('copy', 'insert')
+BATCH_SIZES = {
+    'copy': 50000,
+    'insert': 1000
+}
+COPY_NULL = '\\N'
+
+# Параллельный разбор одного файла по диапазонам байт включается для файлов
+# от этого размера; поля с переводами строк внутри кавычек в таких файлах не допускаются
+PARALLEL_MIN_FILE_SIZE = 64 * 1024 * 1024
+
+# Память для пересоздания индексов после загрузки с отложенными индексами
+INDEX_MAINTENANCE_WORK_MEM = '512MB'
+
+# Сколько примеров строк сохраняется в логе для каждого типа ошибки
+ROW_ERROR_SAMPLES = 3
+
+# Глубина очереди готовых пакетов при конвейерной загрузке (0 - без конвейера)
+PIPELINE_DEPTH = 4
+
+# Объем начала файла для определения формата
+SNIFF_SAMPLE_SIZE = 1024
+
+# Размер блока, которым читается файл при загрузке с контрольными точками
+CHECKPOINT_BLOCK_SIZE = 1024 * 1024
+
+# Построчное преобразование или векторное по блокам (требуется numpy)
+LOAD_ENGINES = ('row', 'numpy')
+
+# Стратегии загрузки: очистка и вставка либо слияние через промежуточную таблицу
+LOAD_STRATEGIES = ('truncate', 'merge')
+
+# Порядок загрузки: таблица загружается только после успешной загрузки
+# перечисленных таблиц, например {'ft_posting_f': ['md_account_d']}
+TABLE_DEPENDENCIES = {
+    # календарь курсов строится по валютам из справочников
+    'md_exchange_rate_d': ['md_account_d', 'md_currency_d'],
+    # атрибуты счетов берутся из справочника балансовых счетов
+    'md_account_d': ['md_ledger_account_s']
+}
+
+
 class ETLError(Exception):
     pass
 
 
-def detect_csv_format(file_path):
+class RowErrors:
+    # Ошибки строк считаются по типам, в лог попадает сводка с несколькими примерами
+    def __init__(self, samples=ROW_ERROR_SAMPLES):
+        self.samples = samples
+        self.errors = {}
+        self.fallbacks = 0
+        self.fallback_reason = None
+
+    def add(self, row_number, row, error):
+        kind = f"{type(error).__name__}: {str(error).split(':', 1)[0]}"
+        count, examples = self.errors.get(kind, (0, []))
+        if len(examples) < self.samples:
+            examples.append(f"строка {row_number} {row!r}: {str(error)}")
+        self.errors[kind] = (count + 1, examples)
+
+    def add_fallback(self, reason):
+        self.fallbacks += 1
+        self.fallback_reason = self.fallback_reason or reason
+
+    def log(self, source):
+        if self.fallbacks:
+            logger.warning(f"{source}: {self.fallbacks} блоков обработано построчно, "
+                           f"первая причина: {self.fallback_reason}")
+        for kind, (count, examples) in self.errors.items():
+            logger.error(f"{source}: {count} строк с ошибкой {kind}. Примеры:\n  "
+                         + "\n  ".join(examples))
+
+
+def open_zstd(file_path, encoding):
+    if zstandard is None:
+        raise ETLError(f"Для чтения {file_path} требуется пакет zstandard")
+    raw = open(file_path, 'rb')
+    return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True),
+                            encoding=encoding)
+
+
+SOURCE_OPENERS = {
+    '.gz': lambda file_path, encoding: gzip.open(file_path, 'rt', encoding=encoding),
+    '.bz2': lambda file_path, encoding: bz2.open(file_path, 'rt', encoding=encoding),
+    '.xz': lambda file_path, encoding: lzma.open(file_path, 'rt', encoding=encoding),
+    '.zst': open_zstd
+}
+
+
+def open_source(file_path, encoding='utf-8-sig'):
+    # Сжатые файлы распаковываются потоком, без промежуточного файла на диске
+    opener = SOURCE_OPENERS.get(os.path.splitext(file_path)[1].lower())
+    if opener is None:
+        return open(file_path, 'r', encoding=encoding)
+    return opener(file_path, encoding)
+
+
+class TrackedSource:
+    # Чтение несжатого файла блоками, которые заканчиваются на границе строки. Смещение
+    # в байтах после последней выданной строки вычисляется только по запросу (раз на пакет),
+    # поэтому строки выдаются без построчного readline и декодирования
+    def __init__(self, file_path, block_size=CHECKPOINT_BLOCK_SIZE):
+        self.raw = open(file_path, 'rb')
+        self.block_size = block_size
+        self.block = io.StringIO(newline='')
+        self.seek(0)
+
+    @property
+    def offset(self):
+        position = self.block.tell()
+        if self.block_ascii:
+            return self.block_start + position
+        return self.block_start + len(self.block_text[:position].encode('utf-8'))
+
+    def seek(self, offset):
+        # Текущий блок дочитывается до конца, чтобы уже созданные итераторы не выдали
+        # оставшиеся в нем строки и продолжили чтение с нового смещения
+        self.block.seek(0, io.SEEK_END)
+        self.raw.seek(offset)
+        self.block_start = offset
+        self.block_text = ''
+        self.block_ascii = True
+        self.block = io.StringIO(newline='')
+
+    def read_block(self):
+        position = self.raw.tell()
+        data = self.raw.read(self.block_size)
+        if not data:
+            self.seek(position)
+            return False
+        self.block_start = position
+        data += self.raw.readline()
+        if self.block_start == 0 and data.startswith(codecs.BOM_UTF8):
+            data = data[len(codecs.BOM_UTF8):]
+            self.block_start = len(codecs.BOM_UTF8)
+        self.block_text = data.decode('utf-8')
+        self.block_ascii = data.isascii()
+        self.block = io.StringIO(self.block_text, newline='')
+        return True
+
+    def blocks(self):
+        yield self.block
+        while self.read_block():
+            yield self.block
+
+    def __iter__(self):
+        # Строки блока перебирает chain без Python-кода на каждую строку; позиция хранится
+        # в самом блоке, поэтому повторный iter() продолжает с того же места
+        return chain.from_iterable(self.blocks())
+
+    def close(self):
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def source_position(f):
+    if isinstance(f, TrackedSource):
+        return f.offset
     try:
-        with open(file_path, 'r', encoding='utf-8-sig') as f:
-            first_line = f.readline().strip()
-            if ';' in first_line:
-                dialect = csv.excel()
-                dialect.delimiter = ';'
-                has_header = True
-            else:
-                f.seek(0)
-                sample = f.read(1024)
-                f.seek(0)
-                sniffer = csv.Sniffer()
-                dialect = sniffer.sniff(sample)
-                has_header = sniffer.has_header(sample)
-
-            logger.info(f"Определен формат файла {file_path}: "
-                        f"разделитель={dialect.delimiter!r}, "
-                        f"квотирование={dialect.quotechar!r}")
-            return dialect, has_header
+        return f.buffer.tell()
+    except (AttributeError, OSError):
+        return None
+
+
+def read_head(f, size=SNIFF_SAMPLE_SIZE):
+    head = []
+    read = 0
+    for line in f:
+        head.append(line)
+        read += len(line)
+        if read >= size:
+            break
+    return head
+
+
+def pinned_dialect(options):
+    dialect = csv.excel()
+    for name, value in options.items():
+        if name != 'has_header':
+            setattr(dialect, name, value)
+    return dialect, options.get('has_header', True)
+
+
+def manifest_dialect(dialect, has_header):
+    # Параметры определенного формата, сохраняемые в манифесте вместе с отпечатком файла;
+    # восстанавливаются через pinned_dialect
+    return {
+        'delimiter': dialect.delimiter,
+        'quotechar': dialect.quotechar,
+        'doublequote': dialect.doublequote,
+        'skipinitialspace': dialect.skipinitialspace,
+        'has_header': has_header
+    }
+
+
+def detect_csv_format(file_path, head=None):
+    try:
+        if head is None:
+            with open_source(file_path) as f:
+                head = read_head(f)
+        first_line = head[0].strip() if head else ''
+        if ';' in first_line:
+            dialect = csv.excel()
+            dialect.delimiter = ';'
+            has_header = True
+        else:
+            sample = ''.join(head)[:SNIFF_SAMPLE_SIZE]
+            sniffer = csv.Sniffer()
+            dialect = sniffer.sniff(sample)
+            has_header = sniffer.has_header(sample)
+
+        logger.info(f"Определен формат файла {file_path}: "
+                    f"разделитель={dialect.delimiter!r}, "
+                    f"квотирование={dialect.quotechar!r}")
+        return dialect, has_header
     except Exception as e:
         raise ETLError(f"Ошибка определения формата CSV: {str(e)}")
 
 
+DATE_FORMATS = [
+    '%d.%m.%Y', '%Y-%m-%d', '%d-%m-%Y', '%Y%m%d', '%m/%d/%Y'
+]
+
+
 def parse_date(date_str):
-    date_formats = [
-        '%d.%m.%Y', '%Y-%m-%d', '%d-%m-%Y', '%Y%m%d', '%m/%d/%Y'
-    ]
     if not date_str or str(date_str).strip().lower() in ('null', ''):
         return None
-    for fmt in date_formats:
+    for fmt in DATE_FORMATS:
         try:
             return datetime.strptime(str(date_str).strip(), fmt).date()
         except ValueError:
@@ -87,14 +308,56 @@ def parse_date(date_str):
     raise ValueError(f"Неизвестный формат даты: {date_str}")
 
 
+def parse_dotted_date(date_str):
+    day, month, year = date_str.split('.')
+    if len(year) != 4:
+        raise ValueError(f"Неизвестный формат даты: {date_str}")
+    return date(int(year), int(month), int(day))
+
+
+class DateColumnParser:
+    # Формат даты колонки определяется по первому значению и далее проверяется первым
+    def __init__(self):
+        self.date_format = None
+
+    def __call__(self, date_str):
+        if self.date_format == '%d.%m.%Y':
+            try:
+                return parse_dotted_date(date_str)
+            except ValueError:
+                pass
+        elif self.date_format is not None:
+            try:
+                return datetime.strptime(date_str, self.date_format).date()
+            except ValueError:
+                pass
+        if date_str.lower() == 'null':
+            return None
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(date_str, fmt).date()
+            except ValueError:
+                continue
+            self.date_format = fmt
+            return parsed
+        raise ValueError(f"Неизвестный формат даты: {date_str}")
+
+
+METRIC_COLUMNS = ('read_seconds', 'convert_seconds', 'write_seconds',
+                  'bytes_read', 'batches_sent', 'rows_rejected')
+
+
 def log_process(conn, process_name, start_time, end_time=None, status='STARTED',
-                rows_processed=None, error_message=None):
+                rows_processed=None, error_message=None, metrics=None):
+    metrics = metrics or {}
     try:
         with conn.cursor() as cursor:
             query = """
                 INSERT INTO logs.etl_logs 
-                (process_name, start_time, end_time, status, rows_processed, error_message)
-                VALUES (%s, %s, %s, %s, %s, %s)
+                (process_name, start_time, end_time, status, rows_processed, error_message,
+                 read_seconds, convert_seconds, write_seconds, bytes_read, batches_sent,
+                 rows_rejected)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """
             cursor.execute(query, (
                 process_name,
@@ -102,7 +365,8 @@ def log_process(conn, process_name, start_time, end_time=None, status='STARTED',
                 end_time or datetime.now(),
                 status,
                 rows_processed,
-                error_message
+                error_message,
+                *(metrics.get(name) for name in METRIC_COLUMNS)
             ))
         conn.commit()
     except Exception as e:
@@ -110,7 +374,132 @@ def log_process(conn, process_name, start_time, end_time=None, status='STARTED',
         conn.rollback()
 
 
+@contextmanager
+def measure(metrics, stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics[stage] += time.perf_counter() - started
+
+
+def measured(iterable, metrics, stage):
+    iterator = iter(iterable)
+    while True:
+        with measure(metrics, stage):
+            item = next(iterator, None)
+        if item is None:
+            return
+        yield item
+
+
+def file_fingerprint(file_path, previous=None):
+    stat = os.stat(file_path)
+    fingerprint = {
+        'file_size': stat.st_size,
+        'file_mtime': stat.st_mtime
+    }
+    # Хеш пересчитывается только если изменились размер или время изменения
+    if (previous and previous['file_size'] == fingerprint['file_size']
+            and previous['file_mtime'] == fingerprint['file_mtime']):
+        fingerprint['file_hash'] = previous['file_hash']
+        return fingerprint
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    fingerprint['file_hash'] = digest.hexdigest()
+    return fingerprint
+
+
+def get_manifest(conn, table_name):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT file_size, file_mtime, file_hash, rows_loaded,
+                   csv_delimiter, csv_quotechar, csv_doublequote, csv_skipinitialspace,
+                   csv_has_header
+            FROM logs.etl_file_manifest
+            WHERE table_name = %s
+        """, (table_name,))
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    manifest = dict(zip(('file_size', 'file_mtime', 'file_hash', 'rows_loaded'), row[:4]))
+    manifest['csv_dialect'] = None
+    if row[4] is not None:
+        manifest['csv_dialect'] = dict(zip(
+            ('delimiter', 'quotechar', 'doublequote', 'skipinitialspace', 'has_header'), row[4:]
+        ))
+    return manifest
+
+
+def save_manifest(cursor, table_name, csv_file, fingerprint, rows_loaded, csv_dialect=None):
+    csv_dialect = csv_dialect or {}
+    cursor.execute("""
+        INSERT INTO logs.etl_file_manifest
+        (table_name, file_path, file_size, file_mtime, file_hash, rows_loaded,
+         csv_delimiter, csv_quotechar, csv_doublequote, csv_skipinitialspace, csv_has_header,
+         loaded_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (table_name) DO UPDATE SET
+            file_path = EXCLUDED.file_path,
+            file_size = EXCLUDED.file_size,
+            file_mtime = EXCLUDED.file_mtime,
+            file_hash = EXCLUDED.file_hash,
+            rows_loaded = EXCLUDED.rows_loaded,
+            csv_delimiter = EXCLUDED.csv_delimiter,
+            csv_quotechar = EXCLUDED.csv_quotechar,
+            csv_doublequote = EXCLUDED.csv_doublequote,
+            csv_skipinitialspace = EXCLUDED.csv_skipinitialspace,
+            csv_has_header = EXCLUDED.csv_has_header,
+            loaded_at = EXCLUDED.loaded_at
+    """, (
+        table_name,
+        csv_file,
+        fingerprint['file_size'],
+        fingerprint['file_mtime'],
+        fingerprint['file_hash'],
+        rows_loaded,
+        csv_dialect.get('delimiter'),
+        csv_dialect.get('quotechar'),
+        csv_dialect.get('doublequote'),
+        csv_dialect.get('skipinitialspace'),
+        csv_dialect.get('has_header')
+    ))
+
+
+def get_checkpoint(conn, table_name):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT file_hash, byte_offset, rows_loaded, batch_number
+            FROM logs.etl_load_checkpoints
+            WHERE table_name = %s
+        """, (table_name,))
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip(('file_hash', 'byte_offset', 'rows_loaded', 'batch_number'), row))
+
+
+def save_checkpoint(cursor, table_name, fingerprint, byte_offset, rows_loaded, batch_number):
+    cursor.execute("""
+        INSERT INTO logs.etl_load_checkpoints
+        (table_name, file_hash, byte_offset, rows_loaded, batch_number, updated_at)
+        VALUES (%s, %s, %s, %s, %s, NOW())
+        ON CONFLICT (table_name) DO UPDATE SET
+            file_hash = EXCLUDED.file_hash,
+            byte_offset = EXCLUDED.byte_offset,
+            rows_loaded = EXCLUDED.rows_loaded,
+            batch_number = EXCLUDED.batch_number,
+            updated_at = EXCLUDED.updated_at
+    """, (table_name, fingerprint['file_hash'], byte_offset, rows_loaded, batch_number))
+
+
 def create_table_mapping():
+    # Формат файла можно задать явно, без автоопределения:
+    # 'dialect': {'delimiter': ';', 'quotechar': '"', 'has_header': True}
+    # при 'has_header': False колонки файла должны идти в порядке 'columns'
     return {
         'ft_balance_f': {
             'columns': ['on_date', 'account_rk', 'currency_rk', 'balance_out'],
@@ -129,7 +518,8 @@ def create_table_mapping():
                        'account_number', 'char_type', 'currency_rk', 'currency_code'],
             'types': ['date', 'date', 'numeric', 'varchar', 'varchar', 'numeric', 'varchar'],
             'pk': ['data_actual_date', 'account_rk'],
-            'truncate_before_load': True
+            'truncate_before_load': True,
+            'post_load': ['CALL ds.p_fill_account_ledger()']
         },
         'md_currency_d': {
             'columns': ['currency_rk', 'data_actual_date', 'data_actual_end_date',
@@ -143,7 +533,8 @@ def create_table_mapping():
                        'reduced_cource', 'code_iso_num'],
             'types': ['date', 'date', 'numeric', 'float', 'varchar'],
             'pk': ['data_actual_date', 'currency_rk'],
-            'truncate_before_load': True
+            'truncate_before_load': True,
+            'post_load': ['CALL ds.p_fill_exchange_rate_calendar()']
         },
         'md_ledger_account_s': {
             'columns': ['chapter', 'chapter_name', 'section_number', 'section_name',
@@ -154,101 +545,925 @@ def create_table_mapping():
                       'integer', 'varchar', 'integer', 'varchar', 'varchar',
                        'date', 'date'],
             'pk': ['ledger_account', 'start_date'],
-            'truncate_before_load': True
+            'truncate_before_load': True,
+            'post_load': ['CALL ds.p_fill_account_ledger()']
         }
     }
 
 
-def prepare_row(row, table_info):
-    prepared = {}
-    for col in table_info['columns']:
-        value = row.get(col)
-        if value is None or str(value).strip() == '':
-            prepared[col] = None
+def column_kind(col_type):
+    col_type = col_type.lower()
+    if 'date' in col_type:
+        return 'date'
+    if 'numeric' in col_type or 'integer' in col_type:
+        return 'numeric'
+    if 'float' in col_type:
+        return 'float'
+    return 'text'
+
+
+def convert_numeric(value):
+    try:
+        return float(value) if '.' in value else int(value)
+    except ValueError:
+        return None
+
+
+def convert_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def convert_text(value):
+    return value
+
+
+def compile_row_converter(table_info, fieldnames, columns=None):
+    # Позиции колонок и функции преобразования вычисляются один раз на таблицу
+    columns = columns or table_info['columns']
+    kinds = dict(zip(table_info['columns'], map(column_kind, table_info['types'])))
+    plan = []
+    for col in columns:
+        kind = kinds[col]
+        if kind == 'date':
+            convert_value = DateColumnParser()
+        elif kind == 'numeric':
+            convert_value = convert_numeric
+        elif kind == 'float':
+            convert_value = convert_float
+        else:
+            convert_value = convert_text
+        plan.append((fieldnames.index(col), convert_value))
+    plan = tuple(plan)
+    width = max(position for position, _ in plan) + 1
+
+    def convert_row(row):
+        if len(row) < width:
+            row = row + [''] * (width - len(row))
+        values = []
+        for position, convert_value in plan:
+            value = row[position].strip()
+            values.append(convert_value(value) if value else None)
+        return tuple(values)
+
+    return convert_row
+
+
+def copy_escape(value):
+    return (value.replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+def build_copy_encoders(table_info, columns):
+    # Кодирование значений в текстовый формат COPY по типам из маппинга
+    kinds = dict(zip(table_info['columns'], map(column_kind, table_info['types'])))
+    encoders = []
+    for col in columns:
+        kind = kinds[col]
+        if kind == 'date':
+            encoders.append(date.isoformat)
+        elif kind in ('numeric', 'float'):
+            encoders.append(str)
+        else:
+            encoders.append(lambda value: copy_escape(str(value)))
+    return encoders
+
+
+def encode_copy_row(values, encoders):
+    return '\t'.join(COPY_NULL if value is None else encode(value)
+                     for value, encode in zip(values, encoders))
+
+
+def build_load_queries(table_name, columns):
+    fields = sql.SQL(', ').join(map(sql.Identifier, columns))
+    return {
+        'insert': sql.SQL("INSERT INTO ds.{table} ({fields}) VALUES ({values})").format(
+            table=sql.Identifier(table_name),
+            fields=fields,
+            values=sql.SQL(', ').join([sql.Placeholder()] * len(columns))
+        ),
+        'copy': sql.SQL("COPY ds.{table} ({fields}) FROM STDIN").format(
+            table=sql.Identifier(table_name),
+            fields=fields
+        )
+    }
+
+
+def prepare_staging_table(cursor, table_name):
+    staging_table = f"{table_name}_stage"
+    cursor.execute(sql.SQL(
+        "CREATE UNLOGGED TABLE IF NOT EXISTS ds.{staging} (LIKE ds.{table} INCLUDING DEFAULTS)"
+    ).format(
+        staging=sql.Identifier(staging_table),
+        table=sql.Identifier(table_name)
+    ))
+    cursor.execute(sql.SQL("TRUNCATE TABLE ds.{}").format(sql.Identifier(staging_table)))
+    return staging_table
+
+
+def merge_staging_table(cursor, table_name, staging_table, columns, table_info):
+    target = sql.Identifier(table_name)
+    staging = sql.Identifier(staging_table)
+    fields = sql.SQL(', ').join(map(sql.Identifier, columns))
+    pk = table_info.get('pk')
+
+    if not pk:
+        # Без первичного ключа таблица заменяется целиком в одной транзакции
+        cursor.execute(sql.SQL("TRUNCATE TABLE ds.{}").format(target))
+        cursor.execute(sql.SQL("INSERT INTO ds.{target} ({fields}) SELECT {fields} FROM ds.{staging}").format(
+            target=target, fields=fields, staging=staging
+        ))
+        logger.info(f"Таблица {table_name} без первичного ключа заменена из {staging_table}: "
+                    f"{cursor.rowcount} строк")
+    else:
+        keys = sql.SQL(', ').join(map(sql.Identifier, pk))
+        update_columns = [col for col in columns if col not in pk]
+        if update_columns:
+            # Обновляются только строки, в которых что-то изменилось
+            conflict_action = sql.SQL(
+                "DO UPDATE SET {assignments} WHERE ROW({current}) IS DISTINCT FROM ROW({incoming})"
+            ).format(
+                assignments=sql.SQL(', ').join(
+                    sql.SQL("{col} = EXCLUDED.{col}").format(col=sql.Identifier(col))
+                    for col in update_columns
+                ),
+                current=sql.SQL(', ').join(
+                    sql.SQL("t.{}").format(sql.Identifier(col)) for col in update_columns
+                ),
+                incoming=sql.SQL(', ').join(
+                    sql.SQL("EXCLUDED.{}").format(sql.Identifier(col)) for col in update_columns
+                )
+            )
+        else:
+            conflict_action = sql.SQL("DO NOTHING")
+
+        cursor.execute(sql.SQL("""
+            INSERT INTO ds.{target} AS t ({fields})
+            SELECT DISTINCT ON ({keys}) {fields}
+            FROM ds.{staging}
+            ORDER BY {keys}
+            ON CONFLICT ({keys}) {action}
+        """).format(target=target, fields=fields, keys=keys, staging=staging,
+                    action=conflict_action))
+        upserted = cursor.rowcount
+
+        deleted = 0
+        if table_info.get('truncate_before_load', False):
+            # Полная выгрузка: удаляются строки, которых нет в источнике
+            cursor.execute(sql.SQL("""
+                DELETE FROM ds.{target} AS t
+                WHERE NOT EXISTS (SELECT 1 FROM ds.{staging} AS s WHERE {match})
+            """).format(
+                target=target,
+                staging=staging,
+                match=sql.SQL(' AND ').join(
+                    sql.SQL("s.{col} = t.{col}").format(col=sql.Identifier(col)) for col in pk
+                )
+            ))
+            deleted = cursor.rowcount
+        logger.info(f"Слияние {staging_table} -> {table_name}: "
+                    f"вставлено или изменено {upserted}, удалено {deleted} строк")
+
+    cursor.execute(sql.SQL("TRUNCATE TABLE ds.{}").format(staging))
+
+
+def read_chunks(reader, chunk_size):
+    return iter(lambda: list(islice(reader, chunk_size)), [])
+
+
+def convert_chunk(chunk, convert_row, encoders=None, first_row_number=1, errors=None):
+    batch = []
+    for row_number, row in enumerate(chunk, first_row_number):
+        if not row:
             continue
-        col_type = table_info['types'][table_info['columns'].index(col)]
-        if 'date' in col_type.lower():
-            prepared[col] = parse_date(value)
-        elif 'numeric' in col_type.lower() or 'integer' in col_type.lower():
-            try:
-                prepared[col] = float(value) if '.' in str(value) else int(value)
-            except (ValueError, TypeError):
-                prepared[col] = None
-        elif 'float' in col_type.lower():
+        try:
+            values = convert_row(row)
+        except Exception as e:
+            if errors is None:
+                logger.error(f"Ошибка обработки строки {row_number}: {str(e)}")
+            else:
+                errors.add(row_number, row, e)
+            continue
+        batch.append(encode_copy_row(values, encoders) if encoders else values)
+    return batch
+
+
+def encode_columnar_dates(values, empty):
+    nulls = empty.copy()
+    maybe_null = np.char.str_len(values) == 4
+    nulls[maybe_null] = np.char.lower(values[maybe_null]) == 'null'
+    result = np.full(values.shape, COPY_NULL, dtype='U10')
+    present = values[~nulls]
+    if not present.size:
+        return result
+    if not np.all(np.char.str_len(present) == 10):
+        raise ValueError("даты разной длины")
+
+    # Позиции цифр дня, месяца и года для ДД.ММ.ГГГГ и ГГГГ-ММ-ДД; обе ветки проверяются
+    # одинаково, чтобы принимались только даты, которые разбирает и построчный режим
+    codes = present.astype('U10').view(np.uint32).reshape(-1, 10)
+    if np.all(codes[:, [2, 5]] == ord('.')):
+        positions = [0, 1, 3, 4, 6, 7, 8, 9]
+        iso_order = [6, 7, 8, 9, 2, 3, 4, 5, 0, 1]
+    elif np.all(codes[:, [4, 7]] == ord('-')):
+        positions = [8, 9, 5, 6, 0, 1, 2, 3]
+        iso_order = list(range(10))
+    else:
+        raise ValueError("формат даты не поддерживается векторным преобразованием")
+
+    digits = codes[:, positions].astype(np.int64) - ord('0')
+    if np.any((digits < 0) | (digits > 9)):
+        raise ValueError("нецифровые символы в дате")
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 2] * 10 + digits[:, 3]
+    year = digits[:, 4] * 1000 + digits[:, 5] * 100 + digits[:, 6] * 10 + digits[:, 7]
+    if np.any((day < 1) | (month < 1) | (month > 12) | (year < 1)):
+        raise ValueError("некорректная дата")
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    dates = months.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+    if np.any(dates.astype('datetime64[M]') != months):
+        raise ValueError("некорректный день месяца")
+
+    # Проверенные даты переставляются в ГГГГ-ММ-ДД по кодам символов, без форматирования
+    iso = np.ascontiguousarray(codes[:, iso_order])
+    iso[:, [4, 7]] = ord('-')
+    result[~nulls] = iso.view('U10').ravel()
+    return result
+
+
+# Символы чисел, которые одинаково разбирают Python и PostgreSQL (только ASCII-цифры,
+# без подчеркиваний и специальных значений); остальное обрабатывается построчно
+COLUMNAR_INTEGER_CHARS = '0123456789+-'
+COLUMNAR_FLOAT_CHARS = '0123456789+-.eE'
+
+
+def has_only_chars(values, allowed):
+    # Проверка по кодам символов всего столбца, без Python-кода на каждое значение;
+    # нулевой код - дополнение строк до общей длины массива
+    table = np.zeros(128, dtype=bool)
+    table[[0] + [ord(char) for char in allowed]] = True
+    codes = values.view(np.uint32)
+    return bool(np.all(codes < 128) and np.all(table[np.minimum(codes, 127)]))
+
+
+def parse_columnar_floats(values):
+    # Разбор в float64 совпадает с float() построчного режима; значения, которые PostgreSQL
+    # не примет (переполнение или исчезновение порядка), обрабатываются построчно
+    if not has_only_chars(values, COLUMNAR_FLOAT_CHARS):
+        raise ValueError("некорректное дробное число")
+    floats = values.astype(np.float64)
+    if not np.all(np.isfinite(floats)):
+        raise ValueError("дробное число вне диапазона float64")
+    for value in values[floats == 0].tolist():
+        if re.search('[1-9]', re.split('[eE]', value)[0]):
+            raise ValueError("дробное число вне диапазона float64")
+    return floats
+
+
+def encode_columnar_floats(values, empty):
+    # Проверенный исходный текст PostgreSQL разберет в то же значение, что и float()
+    parse_columnar_floats(values[~empty])
+    return np.where(empty, COPY_NULL, values)
+
+
+def encode_columnar_numerics(values, empty):
+    # Целые значения передаются как есть, дробные - через float64, как в построчном режиме
+    has_dot = np.char.find(values, '.') >= 0
+    integers = values[~empty & ~has_dot]
+    if not has_only_chars(integers, COLUMNAR_INTEGER_CHARS):
+        raise ValueError("некорректное целое число")
+    try:
+        integers.astype(np.int64)
+    except OverflowError:
+        raise ValueError("целое число вне диапазона int64")
+    result = np.where(empty, COPY_NULL, values)
+    if np.any(has_dot):
+        result = result.astype(object)
+        result[has_dot] = parse_columnar_floats(values[has_dot]).astype(str)
+    return result
+
+
+def encode_columnar_text(values, empty):
+    for raw, escaped in (('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'), ('\r', '\\r')):
+        values = np.char.replace(values, raw, escaped)
+    return np.where(empty, COPY_NULL, values)
+
+
+COLUMNAR_ENCODERS = {
+    'date': encode_columnar_dates,
+    'numeric': encode_columnar_numerics,
+    'float': encode_columnar_floats,
+    'text': encode_columnar_text
+}
+
+
+def encode_columnar_chunk(chunk, plan):
+    # ValueError означает, что блок нужно преобразовать построчно
+    rows = [row for row in chunk if row]
+    if not rows:
+        return []
+    width = max(position for position, _ in plan) + 1
+    if min(map(len, rows)) < width:
+        raise ValueError("в блоке есть строки с недостающими колонками")
+
+    transposed = list(zip(*rows))
+    columns = []
+    for position, kind in plan:
+        values = np.char.strip(np.array(transposed[position], dtype=str))
+        columns.append(COLUMNAR_ENCODERS[kind](values, values == '').tolist())
+    return list(map('\t'.join, zip(*columns)))
+
+
+def build_chunk_converter(engine, table_info, fieldnames, columns, method, errors=None):
+    convert_row = compile_row_converter(table_info, fieldnames, columns)
+    encoders = build_copy_encoders(table_info, columns) if method == 'copy' else None
+
+    def convert_rows(chunk, first_row_number):
+        return convert_chunk(chunk, convert_row, encoders, first_row_number, errors)
+
+    if engine == 'row':
+        return convert_rows
+
+    kinds = dict(zip(table_info['columns'], map(column_kind, table_info['types'])))
+    plan = [(fieldnames.index(col), kinds[col]) for col in columns]
+
+    def convert_columnar(chunk, first_row_number):
+        try:
+            return encode_columnar_chunk(chunk, plan)
+        except ValueError as e:
+            if errors is None:
+                logger.warning(f"Блок строк {first_row_number}-{first_row_number + len(chunk) - 1} "
+                               f"обрабатывается построчно: {str(e)}")
+            else:
+                errors.add_fallback(str(e))
+            return convert_rows(chunk, first_row_number)
+
+    return convert_columnar
+
+
+def write_batch(cursor, batch, method, queries):
+    if method == 'copy':
+        buffer = io.StringIO('\n'.join(batch) + '\n')
+        cursor.copy_expert(queries['copy'], buffer)
+    else:
+        cursor.executemany(queries['insert'], batch)
+
+
+def save_reject(cursor, table_name, row, error):
+    cursor.execute("""
+        INSERT INTO logs.etl_rejects (table_name, row_data, error_message)
+        VALUES (%s, %s, %s)
+    """, (table_name, row if isinstance(row, str) else repr(row), str(error).strip()))
+
+
+def write_batch_quarantined(cursor, table_name, batch, method, queries):
+    # Чистый блок пишется одной командой; при ошибке данных блок делится пополам,
+    # пока не останутся отдельные плохие строки
+    cursor.execute("SAVEPOINT etl_batch")
+    try:
+        write_batch(cursor, batch, method, queries)
+    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT etl_batch")
+        cursor.execute("RELEASE SAVEPOINT etl_batch")
+        if len(batch) == 1:
+            save_reject(cursor, table_name, batch[0], e)
+            return 0
+        middle = len(batch) // 2
+        return (write_batch_quarantined(cursor, table_name, batch[:middle], method, queries)
+                + write_batch_quarantined(cursor, table_name, batch[middle:], method, queries))
+    cursor.execute("RELEASE SAVEPOINT etl_batch")
+    return len(batch)
+
+
+def new_metrics():
+    return {
+        'rows_processed': 0,
+        'read_seconds': 0.0,
+        'convert_seconds': 0.0,
+        'write_seconds': 0.0,
+        'bytes_read': 0,
+        'batches_sent': 0,
+        'rows_rejected': 0
+    }
+
+
+def merge_metrics(metrics, other):
+    for name, value in other.items():
+        metrics[name] = (metrics[name] or 0) + (value or 0)
+
+
+def convert_chunks(reader, convert_rows, batch_size, metrics, position=None):
+    # Позиция в файле снимается сразу после чтения блока: при конвейерной
+    # загрузке чтение успевает уйти вперед от записи
+    row_number = 1
+    for chunk in measured(read_chunks(reader, batch_size), metrics, 'read_seconds'):
+        offset = position() if position else None
+        with measure(metrics, 'convert_seconds'):
+            batch = convert_rows(chunk, row_number)
+        row_number += len(chunk)
+        yield batch, sum(1 for row in chunk if row) - len(batch), offset
+
+
+def pipelined(iterable, depth):
+    # Элементы готовятся в отдельном потоке; ограниченная очередь
+    # приостанавливает его, пока потребитель не освободит место
+    items = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stopped.is_set():
             try:
-                prepared[col] = float(value)
-            except (ValueError, TypeError):
-                prepared[col] = None
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((done, e))
         else:
-            prepared[col] = str(value).strip()
-    return prepared
+            put((done, None))
+
+    producer = threading.Thread(target=produce, name='etl-reader', daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+        producer.join()
+
+
+def load_chunks(conn, cursor, reader, convert_rows, batch_size, method, queries,
+                target_table, quarantine, metrics, commit=True, pipeline=0,
+                position=None, checkpoint=None):
+    batches = convert_chunks(reader, convert_rows, batch_size, metrics, position)
+    if pipeline:
+        # Чтение и преобразование следующих пакетов идут параллельно с записью текущего
+        batches = pipelined(batches, pipeline)
+    with closing(batches):
+        for batch, rows_rejected, offset in batches:
+            metrics['rows_rejected'] += rows_rejected
+            if not batch:
+                continue
+            with measure(metrics, 'write_seconds'):
+                if quarantine:
+                    rows_written = write_batch_quarantined(cursor, target_table, batch,
+                                                           method, queries)
+                    metrics['rows_rejected'] += len(batch) - rows_written
+                else:
+                    write_batch(cursor, batch, method, queries)
+                    rows_written = len(batch)
+                if checkpoint:
+                    # Контрольная точка фиксируется в одной транзакции с блоком
+                    checkpoint(cursor, offset, metrics['rows_processed'] + rows_written,
+                               metrics['batches_sent'] + 1)
+                if commit:
+                    conn.commit()
+            metrics['rows_processed'] += rows_written
+            metrics['batches_sent'] += 1
+
+
+def split_byte_ranges(file_path, data_start, parts):
+    # Границы диапазонов сдвигаются на ближайший конец строки
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        step = (size - data_start) // parts
+        bounds = [data_start]
+        for part in range(1, parts):
+            newline = mm.find(b'\n', data_start + part * step)
+            if newline == -1:
+                break
+            if newline + 1 > bounds[-1]:
+                bounds.append(newline + 1)
+        bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def iter_range_lines(file_path, start, end):
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(start)
+        while mm.tell() < end:
+            line = mm.readline()
+            if not line:
+                break
+            yield line.decode('utf-8')
+
+
+def dialect_options(dialect):
+    return {name: getattr(dialect, name)
+            for name in ('delimiter', 'quotechar', 'escapechar', 'doublequote',
+                         'skipinitialspace', 'quoting')}
+
+
+def load_byte_range(task):
+    # Выполняется в отдельном процессе: своя транзакция, подготовленная для двухфазной фиксации
+    metrics = new_metrics()
+    row_errors = RowErrors()
+    conn = psycopg2.connect(**task['db_config'])
+    try:
+        xid = (0, task['gtrid'], f"{task['start']}-{task['end']}")
+        conn.tpc_begin(conn.xid(*xid))
+        dialect, _ = pinned_dialect(task['dialect'])
+        reader = csv.reader(iter_range_lines(task['csv_file'], task['start'], task['end']),
+                            dialect=dialect)
+        convert_rows = build_chunk_converter(task['engine'], task['table_info'],
+                                             task['fieldnames'], task['columns'], 'copy',
+                                             row_errors)
+        queries = build_load_queries(task['target_table'], task['columns'])
+        with conn.cursor() as cursor:
+            load_chunks(conn, cursor, reader, convert_rows, BATCH_SIZES['copy'], 'copy', queries,
+                        task['target_table'], task['quarantine'], metrics, commit=False,
+                        pipeline=task['pipeline'])
+        metrics['bytes_read'] = task['end'] - task['start']
+        conn.tpc_prepare()
+        return xid, metrics
+    finally:
+        conn.close()
+        # Номера строк в сводке считаются от начала диапазона
+        row_errors.log(f"Таблица {task['target_table']}, байты {task['start']}-{task['end']}")
+
+
+def prepared_transactions_limit(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SHOW max_prepared_transactions")
+        limit = int(cursor.fetchone()[0])
+    conn.commit()
+    return limit
+
+
+# Подготовленные транзакции всех таблиц, загружаемых одновременно, делят общий лимит сервера
+_prepared_lock = threading.Lock()
+_prepared_in_use = 0
+
+
+def reserve_prepared_transactions(conn, count):
+    global _prepared_in_use
+    limit = prepared_transactions_limit(conn)
+    with _prepared_lock:
+        if _prepared_in_use + count > limit:
+            return False
+        _prepared_in_use += count
+    return True
+
+
+def release_prepared_transactions(count):
+    global _prepared_in_use
+    with _prepared_lock:
+        _prepared_in_use -= count
+
+
+def recover_prepared_transactions(conn):
+    # Транзакции, оставшиеся подготовленными после аварийного завершения предыдущего запуска
+    database = conn.get_dsn_parameters().get('dbname')
+    for xid in conn.tpc_recover():
+        if xid.gtrid and xid.gtrid.startswith('etl_') and xid.database == database:
+            logger.warning(f"Откат незавершенной подготовленной транзакции {xid.gtrid} ({xid.bqual})")
+            conn.tpc_rollback(xid)
+
 
+def load_byte_ranges(conn, csv_file, workers, task, metrics, has_header=True):
+    with open(csv_file, 'rb') as f:
+        data_start = len(f.readline()) if has_header else 0
+    ranges = split_byte_ranges(csv_file, data_start, workers)
+    gtrid = f"etl_{task['target_table']}_{uuid.uuid4().hex}"
+    logger.info(f"Файл {csv_file} разбит на {len(ranges)} диапазонов для параллельной загрузки")
 
-def load_table(conn, table_name, csv_file, table_info):
+    # Очистка таблицы должна быть зафиксирована до начала записи процессами, поэтому при
+    # ошибке таблица остается пустой; манифест к этому моменту удален, и следующий запуск
+    # загрузит файл заново
+    conn.commit()
+    prepared = []
+    errors = []
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=context,
+                             initializer=setup_worker_logging,
+                             initargs=(worker_log_queue(),)) as executor:
+        futures = [executor.submit(load_byte_range, dict(task, start=start, end=end, gtrid=gtrid))
+                   for start, end in ranges]
+        for future in futures:
+            try:
+                xid, range_metrics = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            prepared.append(xid)
+            merge_metrics(metrics, range_metrics)
+
+    # Фиксация или откат всех диапазонов выполняется в родительском процессе
+    if errors:
+        for xid in prepared:
+            conn.tpc_rollback(conn.xid(*xid))
+        raise ETLError(f"Ошибка параллельной загрузки {csv_file}: {str(errors[0])}") from errors[0]
+    for xid in prepared:
+        conn.tpc_commit(conn.xid(*xid))
+
+
+def drop_secondary_indexes(conn, table_name):
+    # Определения сохраняются до удаления, чтобы после сбоя индексы можно было восстановить
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT i.relname, pg_get_indexdef(ix.indexrelid)
+            FROM pg_index ix
+            JOIN pg_class i ON i.oid = ix.indexrelid
+            WHERE ix.indrelid = %s::regclass
+            AND NOT ix.indisprimary
+            AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = ix.indexrelid)
+            ORDER BY i.relname
+        """, (f"ds.{table_name}",))
+        indexes = cursor.fetchall()
+        for index_name, definition in indexes:
+            cursor.execute("""
+                INSERT INTO logs.etl_deferred_indexes (table_name, index_name, index_definition)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (table_name, index_name) DO NOTHING
+            """, (table_name, index_name,
+                  re.sub(r'^CREATE (UNIQUE )?INDEX ', r'CREATE \1INDEX IF NOT EXISTS ', definition)))
+            cursor.execute(sql.SQL("DROP INDEX {}").format(sql.Identifier('ds', index_name)))
+    conn.commit()
+    if indexes:
+        logger.info(f"Таблица {table_name}: индексы {', '.join(name for name, _ in indexes)} "
+                    f"удалены на время загрузки")
+
+
+def build_index(index_name, definition):
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        conn.autocommit = True
+        started = time.perf_counter()
+        with conn.cursor() as cursor:
+            cursor.execute("SET maintenance_work_mem = %s", (INDEX_MAINTENANCE_WORK_MEM,))
+            cursor.execute(definition)
+        logger.info(f"Индекс {index_name} создан за {time.perf_counter() - started:.2f} с")
+    finally:
+        conn.close()
+
+
+def restore_secondary_indexes(conn, table_name, analyze=False):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT index_name, index_definition FROM logs.etl_deferred_indexes
+            WHERE table_name = %s
+        """, (table_name,))
+        indexes = cursor.fetchall()
+    conn.commit()
+
+    if indexes:
+        # Индексы одной таблицы строятся параллельно, каждый в своем соединении
+        built, errors = [], []
+        with ThreadPoolExecutor(max_workers=min(len(indexes), os.cpu_count() or 1)) as executor:
+            futures = {executor.submit(build_index, *index): index[0] for index in indexes}
+        for future, index_name in futures.items():
+            try:
+                future.result()
+                built.append(index_name)
+            except Exception as e:
+                logger.error(f"Ошибка создания индекса {index_name}: {str(e)}")
+                errors.append(index_name)
+
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM logs.etl_deferred_indexes
+                WHERE table_name = %s AND index_name = ANY(%s)
+            """, (table_name, built))
+        conn.commit()
+        if errors:
+            raise ETLError(f"Не восстановлены индексы таблицы {table_name}: {', '.join(errors)}")
+
+    if analyze:
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("ANALYZE ds.{}").format(sql.Identifier(table_name)))
+        conn.commit()
+
+
+def load_table(conn, table_name, csv_file, table_info, method='copy', force=False,
+               strategy='truncate', engine='row', quarantine=False, workers=1, pipeline=0,
+               defer_indexes=False, resume=False):
     start_time = datetime.now()
-    rows_processed = 0
     process_name = f"LOAD_{table_name}"
+    metrics = new_metrics()
+    row_errors = RowErrors()
+
+    if method not in LOAD_METHODS:
+        raise ETLError(f"Неизвестный способ загрузки: {method}")
+    if strategy not in LOAD_STRATEGIES:
+        raise ETLError(f"Неизвестная стратегия загрузки: {strategy}")
+    if engine not in LOAD_ENGINES:
+        raise ETLError(f"Неизвестный режим преобразования: {engine}")
+    if engine == 'numpy' and (np is None or method != 'copy'):
+        raise ETLError("Векторное преобразование требует numpy и загрузки через COPY")
 
+    indexes_dropped = False
     try:
         log_process(conn, process_name, start_time, status='STARTED')
+        # Индексы, оставшиеся удаленными после прерванной загрузки
+        restore_secondary_indexes(conn, table_name)
 
-        if table_info.get('truncate_before_load', False):
+        if not os.path.exists(csv_file):
+            raise ETLError(f"Файл {csv_file} не найден")
+
+        previous = get_manifest(conn, table_name)
+        fingerprint = file_fingerprint(csv_file, previous)
+        if not force and previous and previous['file_hash'] == fingerprint['file_hash']:
+            if previous['file_mtime'] != fingerprint['file_mtime']:
+                with conn.cursor() as cursor:
+                    save_manifest(cursor, table_name, csv_file, fingerprint,
+                                  previous['rows_loaded'], previous['csv_dialect'])
+                conn.commit()
+            logger.info(f"Файл {csv_file} не изменился с прошлой загрузки, "
+                        f"таблица {table_name} пропущена")
+            log_process(conn, process_name, start_time, datetime.now(), 'SKIPPED',
+                        previous['rows_loaded'])
+            return previous['rows_loaded']
+
+        # Контрольные точки ведутся при последовательной загрузке несжатого файла
+        # прямо в таблицу; продолжить можно только загрузку того же файла
+        checkpoints = (strategy == 'truncate'
+                       and os.path.splitext(csv_file)[1].lower() not in SOURCE_OPENERS)
+        checkpoint = get_checkpoint(conn, table_name) if resume and checkpoints else None
+        if checkpoint and checkpoint['file_hash'] != fingerprint['file_hash']:
+            logger.warning(f"Файл {csv_file} изменился после прерванной загрузки, "
+                           f"таблица {table_name} загружается заново")
+            checkpoint = None
+        elif resume and not checkpoints:
+            logger.warning(f"Продолжение загрузки {table_name} не поддерживается "
+                           f"для сжатых файлов и стратегии {strategy}")
+
+        # Незавершенная загрузка не должна считаться актуальной
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM logs.etl_file_manifest WHERE table_name = %s",
+                           (table_name,))
+            if checkpoint is None:
+                cursor.execute("DELETE FROM logs.etl_load_checkpoints WHERE table_name = %s",
+                               (table_name,))
+
+        # Отложенные индексы только при полной перезагрузке таблицы
+        if defer_indexes and strategy == 'truncate' and table_info.get('truncate_before_load', False):
+            drop_secondary_indexes(conn, table_name)
+            indexes_dropped = True
+
+        target_table = table_name
+        if strategy == 'merge':
+            with conn.cursor() as cursor:
+                target_table = prepare_staging_table(cursor, table_name)
+            logger.info(f"Данные таблицы {table_name} загружаются через {target_table}")
+        elif checkpoint:
+            metrics['rows_processed'] = checkpoint['rows_loaded']
+            logger.info(f"Загрузка таблицы {table_name} продолжается с байта "
+                        f"{checkpoint['byte_offset']}: загружено {checkpoint['rows_loaded']} строк, "
+                        f"{checkpoint['batch_number']} блоков")
+        elif table_info.get('truncate_before_load', False):
             with conn.cursor() as cursor:
                 cursor.execute(sql.SQL("TRUNCATE TABLE ds.{}").format(
                     sql.Identifier(table_name)
                 ))
             logger.info(f"Таблица {table_name} очищена перед загрузкой")
 
-        if not os.path.exists(csv_file):
-            raise ETLError(f"Файл {csv_file} не найден")
-
-        dialect, has_header = detect_csv_format(csv_file)
+        with (TrackedSource(csv_file) if checkpoints else open_source(csv_file)) as f:
+            head = read_head(f)
+            csv_dialect = None
+            if 'dialect' in table_info:
+                dialect, has_header = pinned_dialect(table_info['dialect'])
+            else:
+                if (previous and previous['csv_dialect']
+                        and previous['file_hash'] == fingerprint['file_hash']):
+                    # Формат этого файла уже определен при прошлой загрузке
+                    csv_dialect = previous['csv_dialect']
+                    dialect, _ = pinned_dialect(csv_dialect)
+                    logger.info(f"Формат файла {csv_file} взят из манифеста")
+                else:
+                    dialect, detected_header = detect_csv_format(csv_file, head)
+                    csv_dialect = manifest_dialect(dialect, detected_header)
+                # У автоопределенного формата первая строка всегда считается заголовком
+                has_header = True
 
-        with open(csv_file, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f, dialect=dialect)
-            if not reader.fieldnames:
-                raise ETLError(f"Файл {csv_file} не содержит заголовков столбцов")
+            reader = csv.reader(chain(head, f), dialect=dialect)
+            if checkpoints:
+                # Заголовок перечитывается, чтобы смещения блоков считались от начала файла
+                f.seek(0)
+                reader = csv.reader(f, dialect=dialect)
+            if has_header:
+                fieldnames = next(reader, None)
+                if not fieldnames:
+                    raise ETLError(f"Файл {csv_file} не содержит заголовков столбцов")
+            else:
+                # Файл без заголовка: колонки идут в порядке маппинга
+                fieldnames = list(table_info['columns'])
+            if checkpoint:
+                f.seek(checkpoint['byte_offset'])
+                reader = csv.reader(f, dialect=dialect)
 
             required_columns = set(table_info['columns'])
-            available_columns = set(reader.fieldnames)
+            available_columns = set(fieldnames)
             missing_columns = required_columns - available_columns
             if missing_columns:
                 raise ETLError(f"В файле отсутствуют обязательные колонки: {missing_columns}")
 
-            columns = [col for col in table_info['columns'] if col in reader.fieldnames]
-            query = sql.SQL("INSERT INTO ds.{table} ({fields}) VALUES ({values})").format(
-                table=sql.Identifier(table_name),
-                fields=sql.SQL(', ').join(map(sql.Identifier, columns)),
-                values=sql.SQL(', ').join([sql.Placeholder()] * len(columns))
-            )
+            columns = [col for col in table_info['columns'] if col in fieldnames]
+            convert_rows = build_chunk_converter(engine, table_info, fieldnames, columns, method,
+                                                 row_errors)
+            queries = build_load_queries(target_table, columns)
+            batch_size = BATCH_SIZES[method]
+            load_started = time.perf_counter()
+
+            parallel = (workers > 1 and method == 'copy' and checkpoint is None
+                        and os.path.splitext(csv_file)[1].lower() not in SOURCE_OPENERS
+                        and fingerprint['file_size'] >= PARALLEL_MIN_FILE_SIZE)
+            if parallel and not reserve_prepared_transactions(conn, workers):
+                logger.warning(f"Свободных подготовленных транзакций меньше {workers} "
+                               f"(max_prepared_transactions), таблица {table_name} "
+                               f"загружается в одном процессе")
+                parallel = False
 
             with conn.cursor() as cursor:
-                batch = []
-                for row in reader:
+                if parallel:
                     try:
-                        prepared_row = prepare_row(row, table_info)
-                        batch_values = [prepared_row.get(col) for col in columns]
-                        batch.append(batch_values)
-                        rows_processed += 1
-                        if len(batch) >= 1000:
-                            cursor.executemany(query, batch)
-                            conn.commit()
-                            batch = []
-                    except Exception as e:
-                        logger.error(f"Ошибка обработки строки {rows_processed + 1}: {str(e)}")
-                        continue
-                if batch:
-                    cursor.executemany(query, batch)
+                        load_byte_ranges(conn, csv_file, workers, {
+                            'db_config': DB_CONFIG,
+                            'csv_file': csv_file,
+                            'target_table': target_table,
+                            'table_info': table_info,
+                            'fieldnames': fieldnames,
+                            'columns': columns,
+                            'dialect': dialect_options(dialect),
+                            'engine': engine,
+                            'quarantine': quarantine,
+                            'pipeline': pipeline
+                        }, metrics, has_header)
+                    finally:
+                        release_prepared_transactions(workers)
+                else:
+                    first_batch = checkpoint['batch_number'] if checkpoint else 0
+
+                    def save_batch_checkpoint(cursor, byte_offset, rows_loaded, batch_number):
+                        save_checkpoint(cursor, table_name, fingerprint, byte_offset,
+                                        rows_loaded, first_batch + batch_number)
+
+                    load_chunks(conn, cursor, reader, convert_rows, batch_size, method, queries,
+                                target_table, quarantine, metrics, pipeline=pipeline,
+                                position=lambda: source_position(f),
+                                checkpoint=save_batch_checkpoint if checkpoints else None)
+                    metrics['bytes_read'] = source_position(f)
+                rows_processed = metrics['rows_processed']
+                if strategy == 'merge':
+                    merge_staging_table(cursor, table_name, target_table, columns, table_info)
+                for statement in table_info.get('post_load', []):
+                    logger.info(f"Таблица {table_name}: {statement}")
+                    cursor.execute(statement)
+                save_manifest(cursor, table_name, csv_file, fingerprint, rows_processed,
+                              csv_dialect)
+                cursor.execute("DELETE FROM logs.etl_load_checkpoints WHERE table_name = %s",
+                               (table_name,))
                 conn.commit()
 
+            elapsed = time.perf_counter() - load_started
+            rows_per_sec = rows_processed / elapsed if elapsed > 0 else 0
+            logger.info(f"Таблица {table_name} ({method}, {engine}): {rows_processed} строк "
+                        f"за {elapsed:.2f} с, {rows_per_sec:.0f} строк/с "
+                        f"(чтение {metrics['read_seconds']:.2f} с, "
+                        f"преобразование {metrics['convert_seconds']:.2f} с, "
+                        f"запись {metrics['write_seconds']:.2f} с)")
+
+        if indexes_dropped:
+            indexes_dropped = False
+            restore_secondary_indexes(conn, table_name, analyze=True)
+
+        if metrics['rows_rejected']:
+            logger.warning(f"В таблицу {table_name} не загружено {metrics['rows_rejected']} строк")
         logger.info(f"Успешно загружено {rows_processed} строк в таблицу {table_name}")
-        log_process(conn, process_name, start_time, datetime.now(), 'COMPLETED', rows_processed)
+        log_process(conn, process_name, start_time, datetime.now(), 'COMPLETED', rows_processed,
+                    metrics=metrics)
+        return rows_processed
 
     except Exception as e:
         logger.error(f"Ошибка при загрузке таблицы {table_name}: {str(e)}")
         conn.rollback()
-        log_process(conn, process_name, start_time, datetime.now(), 'FAILED', rows_processed, str(e))
+        if indexes_dropped:
+            try:
+                restore_secondary_indexes(conn, table_name)
+            except Exception as restore_error:
+                logger.error(f"Индексы таблицы {table_name} будут восстановлены при следующей "
+                             f"загрузке: {str(restore_error)}")
+        log_process(conn, process_name, start_time, datetime.now(), 'FAILED',
+                    metrics['rows_processed'], str(e), metrics=metrics)
         raise ETLError(f"Ошибка загрузки {table_name}") from e
+    finally:
+        row_errors.log(f"Таблица {table_name}")
 
 
 def check_files_exist():
@@ -261,27 +1476,173 @@ def check_files_exist():
         logger.info("Все CSV файлы найдены")
 
 
-def main():
+# С Python 3.12 одновременно может работать только один профилировщик на процесс
+_profile_lock = threading.Lock()
+
+
+def run_profiled(profile_file, func, *args, **kwargs):
+    # Профилируется только вызывающий поток: при --pipeline чтение и
+    # преобразование в потоке etl-reader в профиль не попадают
+    with _profile_lock:
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            write_profile(profiler, profile_file)
+
+
+def write_profile(profiler, profile_file):
+    profiler.dump_stats(profile_file)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(15)
+    logger.info(f"Профиль сохранен в {profile_file}:\n{report.getvalue()}")
+
+
+def schedule_tables(tables, run_table, jobs=1, dependencies=None):
+    dependencies = dependencies or {}
+    pending = {table: {dep for dep in dependencies.get(table, ()) if dep in tables}
+               for table in tables}
+    completed, failed, skipped = [], {}, []
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            progress = False
+            for table in list(pending):
+                deps = pending[table]
+                broken = deps & (set(failed) | set(skipped))
+                if broken:
+                    logger.warning(f"Таблица {table} пропущена: не загружены зависимости {broken}")
+                    skipped.append(table)
+                    del pending[table]
+                    progress = True
+                elif deps <= set(completed):
+                    running[executor.submit(run_table, table)] = table
+                    del pending[table]
+                    progress = True
+
+            if not running:
+                if pending and not progress:
+                    raise ETLError(f"Циклические зависимости между таблицами: {sorted(pending)}")
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                table = running.pop(future)
+                try:
+                    future.result()
+                    completed.append(table)
+                except Exception as e:
+                    failed[table] = e
+
+    return completed, failed, skipped
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Загрузка CSV файлов в схему ds')
+    parser.add_argument('--method', choices=LOAD_METHODS, default='copy',
+                        help='способ записи в БД: COPY FROM STDIN или построчный INSERT')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='количество таблиц, загружаемых параллельно')
+    parser.add_argument('--engine', choices=LOAD_ENGINES, default='row',
+                        help='преобразование данных: построчно или векторно блоками (numpy); '
+                             'векторное преобразование примерно в 1.7 раза быстрее, '
+                             'разбор CSV в обоих случаях построчный')
+    parser.add_argument('--strategy', choices=LOAD_STRATEGIES, default='truncate',
+                        help='truncate - очистка и вставка, merge - слияние по первичному ключу '
+                             'через промежуточную таблицу')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='количество процессов для разбора одного большого файла')
+    parser.add_argument('--pipeline', type=int, nargs='?', const=PIPELINE_DEPTH, default=0,
+                        metavar='DEPTH',
+                        help='читать и преобразовывать следующие пакеты во время записи текущего; '
+                             f'DEPTH - размер очереди пакетов (по умолчанию {PIPELINE_DEPTH})')
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help='при полной перезагрузке удалять вторичные индексы и создавать их '
+                             'заново после загрузки')
+    parser.add_argument('--resume', action='store_true',
+                        help='продолжить прерванную загрузку с последней контрольной точки')
+    parser.add_argument('--quarantine', action='store_true',
+                        help='отклоненные базой строки записывать в logs.etl_rejects '
+                             'вместо отмены загрузки')
+    parser.add_argument('--profile', action='append', default=[], metavar='TABLE',
+                        help='снять профиль cProfile при загрузке таблицы (можно повторять); '
+                             'профилируемые таблицы загружаются по очереди, при --pipeline '
+                             'поток чтения в профиль не попадает')
+    parser.add_argument('--force', action='store_true',
+                        help='загружать таблицы, даже если файл не изменился')
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error('--jobs должен быть не меньше 1')
+    if args.workers < 1:
+        parser.error('--workers должен быть не меньше 1')
+    if args.pipeline < 0:
+        parser.error('--pipeline не может быть отрицательным')
+    if args.engine == 'numpy' and (np is None or args.method != 'copy'):
+        parser.error('--engine numpy требует установленного numpy и --method copy')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
     overall_start = datetime.now()
     logger.info("Начало ETL-процесса")
     try:
         check_files_exist()
-        conn = psycopg2.connect(**DB_CONFIG)
+        table_mapping = create_table_mapping()
+        tables = []
+        for table_name in CSV_FILES:
+            if table_name in table_mapping:
+                tables.append(table_name)
+            else:
+                logger.warning(f"Нет информации о таблице {table_name} в маппинге")
+
+        jobs = min(args.jobs, len(tables)) or 1
+        conn_pool = pool.ThreadedConnectionPool(1, jobs + 1, **DB_CONFIG)
         try:
-            log_process(conn, 'ETL_PROCESS', overall_start, status='STARTED')
-            logger.info("Пауза 5 секунд...")
-            time.sleep(5)
-            table_mapping = create_table_mapping()
-            for table_name, csv_file in CSV_FILES.items():
-                if table_name in table_mapping:
-                    logger.info(f"Загрузка данных в таблицу {table_name} из файла {csv_file}")
-                    load_table(conn, table_name, csv_file, table_mapping[table_name])
-                else:
-                    logger.warning(f"Нет информации о таблице {table_name} в маппинге")
-            log_process(conn, 'ETL_PROCESS', overall_start, datetime.now(), 'COMPLETED', None)
-            logger.info(f"ETL-процесс успешно завершен за {datetime.now() - overall_start}")
+            conn = conn_pool.getconn()
+            try:
+                log_process(conn, 'ETL_PROCESS', overall_start, status='STARTED')
+                recover_prepared_transactions(conn)
+
+                load_options = dict(
+                    method=args.method, force=args.force, strategy=args.strategy,
+                    engine=args.engine, quarantine=args.quarantine, workers=args.workers,
+                    pipeline=args.pipeline, defer_indexes=args.defer_indexes,
+                    resume=args.resume
+                )
+
+                def run_table(table_name):
+                    csv_file = CSV_FILES[table_name]
+                    table_conn = conn_pool.getconn()
+                    try:
+                        logger.info(f"Загрузка данных в таблицу {table_name} из файла {csv_file}")
+                        if table_name in args.profile:
+                            run_profiled(f"profile_{table_name}.prof", load_table, table_conn,
+                                         table_name, csv_file, table_mapping[table_name],
+                                         **load_options)
+                        else:
+                            load_table(table_conn, table_name, csv_file, table_mapping[table_name],
+                                       **load_options)
+                    finally:
+                        conn_pool.putconn(table_conn, close=bool(table_conn.closed))
+
+                logger.info(f"Параллельная загрузка {len(tables)} таблиц, потоков: {jobs}")
+                completed, failed, skipped = schedule_tables(
+                    tables, run_table, jobs, TABLE_DEPENDENCIES
+                )
+                if failed or skipped:
+                    error_msg = (f"Не загружены таблицы: {sorted(failed)}, "
+                                 f"пропущены: {sorted(skipped)}")
+                    log_process(conn, 'ETL_PROCESS', overall_start, datetime.now(), 'FAILED',
+                                None, error_msg)
+                    raise ETLError(error_msg)
+                log_process(conn, 'ETL_PROCESS', overall_start, datetime.now(), 'COMPLETED', None)
+                logger.info(f"ETL-процесс успешно завершен за {datetime.now() - overall_start}")
+            finally:
+                conn_pool.putconn(conn)
         finally:
-            conn.close()
+            conn_pool.closeall()
     except Exception as e:
         logger.error(f"Критическая ошибка ETL-процесса: {str(e)}")
         raise
@@ -11,17 +11,107 @@ CREATE TABLE LOGS.etl_logs (
     status VARCHAR(20) NOT NULL,
     rows_processed INTEGER,
     error_message TEXT,
-    duration INTERVAL GENERATED ALWAYS AS (end_time - start_time) STORED
+    duration INTERVAL GENERATED ALWAYS AS (end_time - start_time) STORED,
+    read_seconds NUMERIC(12, 3),
+    convert_seconds NUMERIC(12, 3),
+    write_seconds NUMERIC(12, 3),
+    bytes_read BIGINT,
+    batches_sent INTEGER,
+    rows_rejected INTEGER
 );
 
 COMMENT ON TABLE LOGS.etl_logs IS 'Логирование ETL-процессов';
 COMMENT ON COLUMN LOGS.etl_logs.process_name IS 'Наименование процесса';
 COMMENT ON COLUMN LOGS.etl_logs.start_time IS 'Время начала процесса';
 COMMENT ON COLUMN LOGS.etl_logs.end_time IS 'Время окончания процесса';
-COMMENT ON COLUMN LOGS.etl_logs.status IS 'Статус выполнения (STARTED, SUCCESS, ERROR, COMPLETED)';
+COMMENT ON COLUMN LOGS.etl_logs.status IS 'Статус выполнения (STARTED, SUCCESS, ERROR, COMPLETED, SKIPPED)';
 COMMENT ON COLUMN LOGS.etl_logs.rows_processed IS 'Количество обработанных строк';
 COMMENT ON COLUMN LOGS.etl_logs.error_message IS 'Сообщение об ошибке (если есть)';
 COMMENT ON COLUMN LOGS.etl_logs.duration IS 'Продолжительность выполнения процесса';
+COMMENT ON COLUMN LOGS.etl_logs.read_seconds IS 'Время чтения и разбора файла, с';
+COMMENT ON COLUMN LOGS.etl_logs.convert_seconds IS 'Время преобразования строк, с';
+COMMENT ON COLUMN LOGS.etl_logs.write_seconds IS 'Время записи в БД, с';
+COMMENT ON COLUMN LOGS.etl_logs.bytes_read IS 'Прочитано байт из файла';
+COMMENT ON COLUMN LOGS.etl_logs.batches_sent IS 'Количество отправленных в БД пакетов';
+COMMENT ON COLUMN LOGS.etl_logs.rows_rejected IS 'Количество отбракованных строк';
+
+-- Манифест загруженных файлов для пропуска неизмененных источников
+CREATE TABLE LOGS.etl_file_manifest (
+    table_name VARCHAR(100) PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    file_size BIGINT NOT NULL,
+    file_mtime DOUBLE PRECISION NOT NULL,
+    file_hash VARCHAR(64) NOT NULL,
+    rows_loaded INTEGER,
+    csv_delimiter VARCHAR(1),
+    csv_quotechar VARCHAR(1),
+    csv_doublequote BOOLEAN,
+    csv_skipinitialspace BOOLEAN,
+    csv_has_header BOOLEAN,
+    loaded_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE LOGS.etl_file_manifest IS 'Отпечатки файлов, загруженных в таблицы DS';
+COMMENT ON COLUMN LOGS.etl_file_manifest.table_name IS 'Наименование целевой таблицы';
+COMMENT ON COLUMN LOGS.etl_file_manifest.file_path IS 'Путь к файлу-источнику';
+COMMENT ON COLUMN LOGS.etl_file_manifest.file_size IS 'Размер файла в байтах';
+COMMENT ON COLUMN LOGS.etl_file_manifest.file_mtime IS 'Время изменения файла (unix time)';
+COMMENT ON COLUMN LOGS.etl_file_manifest.file_hash IS 'SHA-256 содержимого файла';
+COMMENT ON COLUMN LOGS.etl_file_manifest.rows_loaded IS 'Количество загруженных строк';
+COMMENT ON COLUMN LOGS.etl_file_manifest.csv_delimiter IS 'Определенный разделитель полей (NULL, если формат задан в маппинге)';
+COMMENT ON COLUMN LOGS.etl_file_manifest.csv_quotechar IS 'Определенный символ квотирования';
+COMMENT ON COLUMN LOGS.etl_file_manifest.csv_doublequote IS 'Кавычки внутри поля удваиваются';
+COMMENT ON COLUMN LOGS.etl_file_manifest.csv_skipinitialspace IS 'Пробелы после разделителя пропускаются';
+COMMENT ON COLUMN LOGS.etl_file_manifest.csv_has_header IS 'Sniffer определил строку заголовка';
+COMMENT ON COLUMN LOGS.etl_file_manifest.loaded_at IS 'Время последней загрузки';
+
+-- Вторичные индексы, удаленные на время полной перезагрузки таблицы
+CREATE TABLE LOGS.etl_deferred_indexes (
+    table_name VARCHAR(100) NOT NULL,
+    index_name VARCHAR(100) NOT NULL,
+    index_definition TEXT NOT NULL,
+    dropped_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (table_name, index_name)
+);
+
+COMMENT ON TABLE LOGS.etl_deferred_indexes IS 'Определения индексов, которые нужно создать заново после загрузки';
+COMMENT ON COLUMN LOGS.etl_deferred_indexes.table_name IS 'Наименование таблицы DS';
+COMMENT ON COLUMN LOGS.etl_deferred_indexes.index_name IS 'Наименование индекса';
+COMMENT ON COLUMN LOGS.etl_deferred_indexes.index_definition IS 'Команда CREATE INDEX IF NOT EXISTS';
+COMMENT ON COLUMN LOGS.etl_deferred_indexes.dropped_at IS 'Время удаления индекса';
+
+-- Контрольные точки загрузки для продолжения после сбоя
+CREATE TABLE LOGS.etl_load_checkpoints (
+    table_name VARCHAR(100) PRIMARY KEY,
+    file_hash VARCHAR(64) NOT NULL,
+    byte_offset BIGINT NOT NULL,
+    rows_loaded BIGINT NOT NULL,
+    batch_number INTEGER NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE LOGS.etl_load_checkpoints IS 'Последний зафиксированный блок незавершенной загрузки';
+COMMENT ON COLUMN LOGS.etl_load_checkpoints.table_name IS 'Наименование целевой таблицы';
+COMMENT ON COLUMN LOGS.etl_load_checkpoints.file_hash IS 'SHA-256 загружаемого файла';
+COMMENT ON COLUMN LOGS.etl_load_checkpoints.byte_offset IS 'Смещение в файле после последней загруженной строки';
+COMMENT ON COLUMN LOGS.etl_load_checkpoints.rows_loaded IS 'Количество загруженных строк';
+COMMENT ON COLUMN LOGS.etl_load_checkpoints.batch_number IS 'Номер последнего зафиксированного блока';
+COMMENT ON COLUMN LOGS.etl_load_checkpoints.updated_at IS 'Время фиксации блока';
+
+-- Отбракованные при загрузке строки
+CREATE TABLE LOGS.etl_rejects (
+    reject_id SERIAL PRIMARY KEY,
+    table_name VARCHAR(100) NOT NULL,
+    row_data TEXT,
+    error_message TEXT,
+    rejected_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE LOGS.etl_rejects IS 'Строки, отклоненные базой данных при загрузке в режиме карантина';
+COMMENT ON COLUMN LOGS.etl_rejects.table_name IS 'Наименование целевой таблицы';
+COMMENT ON COLUMN LOGS.etl_rejects.row_data IS 'Строка в формате COPY или значения INSERT';
+COMMENT ON COLUMN LOGS.etl_rejects.error_message IS 'Текст ошибки базы данных';
+COMMENT ON COLUMN LOGS.etl_rejects.rejected_at IS 'Время отбраковки';
 
 -- Таблица балансов
 CREATE TABLE DS.FT_BALANCE_F (
@@ -109,6 +199,19 @@ COMMENT ON COLUMN DS.MD_EXCHANGE_RATE_D.currency_rk IS 'Идентификато
 COMMENT ON COLUMN DS.MD_EXCHANGE_RATE_D.reduced_cource IS 'Курс валюты';
 COMMENT ON COLUMN DS.MD_EXCHANGE_RATE_D.code_iso_num IS 'Цифровой код валюты по ISO';
 
+-- Календарь курсов валют
+CREATE TABLE DS.MD_EXCHANGE_RATE_CALENDAR (
+    currency_rk NUMERIC NOT NULL,
+    on_date DATE NOT NULL,
+    reduced_cource FLOAT,
+    PRIMARY KEY (currency_rk, on_date)
+);
+
+COMMENT ON TABLE DS.MD_EXCHANGE_RATE_CALENDAR IS 'Курсы валют на каждый день (заполняется ds.p_fill_exchange_rate_calendar)';
+COMMENT ON COLUMN DS.MD_EXCHANGE_RATE_CALENDAR.currency_rk IS 'Идентификатор валюты';
+COMMENT ON COLUMN DS.MD_EXCHANGE_RATE_CALENDAR.on_date IS 'Дата курса';
+COMMENT ON COLUMN DS.MD_EXCHANGE_RATE_CALENDAR.reduced_cource IS 'Курс валюты на дату (ds.f_getrate)';
+
 -- Таблица балансовых счетов
 CREATE TABLE DS.MD_LEDGER_ACCOUNT_S (
     chapter CHAR(1),
@@ -156,6 +259,26 @@ COMMENT ON COLUMN DS.MD_LEDGER_ACCOUNT_S.characteristic IS 'Характерис
 COMMENT ON COLUMN DS.MD_LEDGER_ACCOUNT_S.start_date IS 'Дата начала действия';
 COMMENT ON COLUMN DS.MD_LEDGER_ACCOUNT_S.end_date IS 'Дата окончания действия';
 
+-- Счета с вычисленными атрибутами балансового счета
+CREATE TABLE DS.MD_ACCOUNT_LEDGER (
+    account_rk NUMERIC NOT NULL,
+    data_actual_date DATE NOT NULL,
+    data_actual_end_date DATE NOT NULL,
+    ledger_account VARCHAR(5) NOT NULL,
+    chapter CHAR(1),
+    characteristic VARCHAR(1) NOT NULL,
+    is_rub SMALLINT NOT NULL
+);
+
+COMMENT ON TABLE DS.MD_ACCOUNT_LEDGER IS 'Балансовый счет, глава и валютный признак версий счета (заполняется ds.p_fill_account_ledger)';
+COMMENT ON COLUMN DS.MD_ACCOUNT_LEDGER.account_rk IS 'Идентификатор счета';
+COMMENT ON COLUMN DS.MD_ACCOUNT_LEDGER.data_actual_date IS 'Дата начала актуальности (версии счета и балансового счета)';
+COMMENT ON COLUMN DS.MD_ACCOUNT_LEDGER.data_actual_end_date IS 'Дата окончания актуальности (версии счета и балансового счета)';
+COMMENT ON COLUMN DS.MD_ACCOUNT_LEDGER.ledger_account IS 'Балансовый счет (первые 5 символов номера счета)';
+COMMENT ON COLUMN DS.MD_ACCOUNT_LEDGER.chapter IS 'Глава';
+COMMENT ON COLUMN DS.MD_ACCOUNT_LEDGER.characteristic IS 'Тип счета (А - активный, П - пассивный)';
+COMMENT ON COLUMN DS.MD_ACCOUNT_LEDGER.is_rub IS 'Признак рублевого счета (1 - рубли, 0 - валюта)';
+
 -- Создание индексов для улучшения производительности
 CREATE INDEX idx_ft_posting_f_oper_date ON DS.FT_POSTING_F(oper_date);
 CREATE INDEX idx_ft_posting_f_credit_account ON DS.FT_POSTING_F(credit_account_rk);
@@ -168,6 +291,9 @@ CREATE INDEX idx_md_currency_d_currency_code ON DS.MD_CURRENCY_D(currency_code);
 
 CREATE INDEX idx_md_exchange_rate_d_currency_rk ON DS.MD_EXCHANGE_RATE_D(currency_rk);
 
+CREATE INDEX idx_md_account_ledger_account_rk ON DS.MD_ACCOUNT_LEDGER(account_rk);
+CREATE INDEX idx_md_account_ledger_ledger_account ON DS.MD_ACCOUNT_LEDGER(ledger_account);
+
 -- Представление для удобного просмотра логов
 CREATE OR REPLACE VIEW LOGS.v_etl_logs_report AS
 SELECT
@@ -177,6 +303,13 @@ SELECT
     status,
     rows_processed,
     duration,
+    ROUND(rows_processed / NULLIF(EXTRACT(EPOCH FROM duration), 0), 1) AS rows_per_sec,
+    read_seconds,
+    convert_seconds,
+    write_seconds,
+    bytes_read,
+    batches_sent,
+    rows_rejected,
     error_message
 FROM LOGS.etl_logs
 ORDER BY start_time DESC;
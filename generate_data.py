@@ -0,0 +1,172 @@
+import os
+import csv
+import random
+import argparse
+from datetime import datetime, timedelta
+from etl import DATA_DIR, create_table_mapping, logger
+
+DATE_FORMAT = '%d.%m.%Y'
+END_OF_TIME = datetime(2050, 12, 31).date()
+
+# Валюты: currency_rk, цифровой код, буквенный код, базовый курс к рублю
+CURRENCIES = [
+    (1, '643', 'RUB', None),
+    (2, '810', 'RUR', None),
+    (3, '840', 'USD', 57.6),
+    (4, '978', 'EUR', 68.9),
+    (5, '156', 'CNY', 8.8),
+    (6, '826', 'GBP', 77.8)
+]
+
+# Балансовые счета: глава, номер, признак активного/пассивного счета
+LEDGER_ACCOUNTS = [
+    ('A', 20202, 'А'), ('A', 30102, 'А'), ('A', 30110, 'А'), ('A', 44505, 'А'),
+    ('A', 45205, 'А'), ('A', 45505, 'А'), ('A', 47423, 'А'), ('A', 60312, 'А'),
+    ('A', 30109, 'П'), ('A', 40702, 'П'), ('A', 40802, 'П'), ('A', 40817, 'П'),
+    ('A', 42301, 'П'), ('A', 42306, 'П'), ('A', 47422, 'П'), ('A', 60322, 'П'),
+    ('B', 70601, 'П'), ('B', 70606, 'А')
+]
+
+
+def format_date(value):
+    return value.strftime(DATE_FORMAT)
+
+
+class TableWriter:
+    # Колонки файла берутся из маппинга etl, чтобы генератор не расходился с загрузкой
+    def __init__(self, output_dir, table_name, table_mapping):
+        self.path = os.path.join(output_dir, f"{table_name}.csv")
+        self.columns = table_mapping[table_name]['columns']
+        self.file = open(self.path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file, delimiter=';')
+        self.writer.writerow(self.columns)
+        self.rows = 0
+
+    def write(self, **values):
+        self.writer.writerow([values.get(col, '') for col in self.columns])
+        self.rows += 1
+
+    def close(self):
+        self.file.close()
+        logger.info(f"Сгенерирован файл {self.path}: {self.rows} строк")
+
+
+def generate(output_dir, accounts, postings, date_from, date_to, seed=None):
+    rnd = random.Random(seed)
+    table_mapping = create_table_mapping()
+    os.makedirs(output_dir, exist_ok=True)
+    balance_date = date_from - timedelta(days=1)
+    days = [date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+
+    writer = TableWriter(output_dir, 'md_ledger_account_s', table_mapping)
+    for chapter, ledger_account, characteristic in LEDGER_ACCOUNTS:
+        writer.write(
+            chapter=chapter,
+            chapter_name='Балансовые счета' if chapter == 'A' else 'Доходы и расходы',
+            section_number=int(str(ledger_account)[0]),
+            section_name=f"Раздел {str(ledger_account)[0]}",
+            subsection_name=f"Подраздел {str(ledger_account)[:2]}",
+            ledger1_account=int(str(ledger_account)[:3]),
+            ledger1_account_name=f"Счет {str(ledger_account)[:3]}",
+            ledger_account=ledger_account,
+            ledger_account_name=f"Счет {ledger_account}",
+            characteristic=characteristic,
+            start_date=format_date(datetime(2017, 1, 1).date()),
+            end_date=format_date(END_OF_TIME)
+        )
+    writer.close()
+
+    writer = TableWriter(output_dir, 'md_currency_d', table_mapping)
+    for currency_rk, currency_code, code_iso_char, _ in CURRENCIES:
+        writer.write(
+            currency_rk=currency_rk,
+            data_actual_date=format_date(datetime(2017, 1, 1).date()),
+            data_actual_end_date=format_date(END_OF_TIME),
+            currency_code=currency_code,
+            code_iso_char=code_iso_char
+        )
+    writer.close()
+
+    writer = TableWriter(output_dir, 'md_exchange_rate_d', table_mapping)
+    for currency_rk, currency_code, _, base_rate in CURRENCIES:
+        if base_rate is None:
+            continue
+        rate = base_rate
+        for on_date in [balance_date] + days:
+            rate = round(rate * (1 + rnd.uniform(-0.01, 0.01)), 4)
+            writer.write(
+                data_actual_date=format_date(on_date),
+                data_actual_end_date=format_date(on_date),
+                currency_rk=currency_rk,
+                reduced_cource=rate,
+                code_iso_num=currency_code
+            )
+    writer.close()
+
+    account_writer = TableWriter(output_dir, 'md_account_d', table_mapping)
+    balance_writer = TableWriter(output_dir, 'ft_balance_f', table_mapping)
+    for account_rk in range(1, accounts + 1):
+        _, ledger_account, characteristic = rnd.choice(LEDGER_ACCOUNTS)
+        currency_rk, currency_code, _, _ = rnd.choice(CURRENCIES)
+        account_writer.write(
+            data_actual_date=format_date(datetime(2017, 1, 1).date()),
+            data_actual_end_date=format_date(END_OF_TIME),
+            account_rk=account_rk,
+            account_number=f"{ledger_account}{currency_code}{account_rk:012d}",
+            char_type=characteristic,
+            currency_rk=currency_rk,
+            currency_code=currency_code
+        )
+        balance_writer.write(
+            on_date=format_date(balance_date),
+            account_rk=account_rk,
+            currency_rk=currency_rk,
+            balance_out=round(rnd.uniform(0, 1000000), 2)
+        )
+    account_writer.close()
+    balance_writer.close()
+
+    writer = TableWriter(output_dir, 'ft_posting_f', table_mapping)
+    formatted_days = [format_date(on_date) for on_date in days]
+    for _ in range(postings):
+        amount = round(rnd.lognormvariate(8, 2), 2)
+        writer.write(
+            oper_date=rnd.choice(formatted_days),
+            credit_account_rk=rnd.randint(1, accounts),
+            debet_account_rk=rnd.randint(1, accounts),
+            credit_amount=amount,
+            debet_amount=amount
+        )
+    writer.close()
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Генерация тестовых CSV файлов для схемы ds')
+    parser.add_argument('--output-dir', default=DATA_DIR, help='каталог для CSV файлов')
+    parser.add_argument('--accounts', type=int, default=10000, help='количество счетов')
+    parser.add_argument('--postings', type=int, default=1000000, help='количество проводок')
+    parser.add_argument('--date-from', type=parse_date, default=parse_date('2018-01-01'),
+                        help='первый день проводок, YYYY-MM-DD')
+    parser.add_argument('--date-to', type=parse_date, default=parse_date('2018-01-31'),
+                        help='последний день проводок, YYYY-MM-DD')
+    parser.add_argument('--seed', type=int, default=None, help='начальное значение генератора')
+    args = parser.parse_args(argv)
+    if args.date_from > args.date_to:
+        parser.error('--date-from не может быть больше --date-to')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.info(f"Генерация данных в {args.output_dir}: {args.accounts} счетов, "
+                f"{args.postings} проводок")
+    generate(args.output_dir, args.accounts, args.postings, args.date_from, args.date_to,
+             args.seed)
+
+
+if __name__ == '__main__':
+    main()
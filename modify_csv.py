@@ -12,35 +12,44 @@ def modify_csv_file(input_file, output_file=None, changes_count=3):
     try:
         logger.info(f"Модификация файла: {input_file}")
 
-        with open(input_file, 'r', encoding='utf-8') as infile:
+        # Первый проход: размер файла, второй - построчная запись с изменениями
+        with open(input_file, 'r', encoding='utf-8', newline='') as infile:
             reader = csv.reader(infile)
-            data = list(reader)
+            header = next(reader, [])
+            rows_count = sum(1 for _ in reader)
 
-        if len(data) <= 1:
+        if rows_count == 0:
             logger.warning("Файл не содержит данных для модификации")
             return input_file
 
+        planned = {}
+        for _ in range(min(changes_count, rows_count)):
+            row_idx = random.randint(1, rows_count)
+            col_idx = random.randint(0, len(header) - 1)
+            planned.setdefault(row_idx, []).append(col_idx)
+
         changes_made = 0
         changes_log = []
 
-        for _ in range(min(changes_count, len(data) - 1)):
-            row_idx = random.randint(1, len(data) - 1)
-            col_idx = random.randint(0, len(data[0]) - 1)
-
-            original_value = data[row_idx][col_idx]
+        with open(input_file, 'r', encoding='utf-8', newline='') as infile, \
+                open(output_file, 'w', newline='', encoding='utf-8') as outfile:
+            reader = csv.reader(infile)
+            writer = csv.writer(outfile)
+            writer.writerow(next(reader))
 
-            if original_value and original_value.replace('.', '').replace('-', '').isdigit():
-                new_value = str(float(original_value) + random.randint(100, 1000))
-            else:
-                new_value = f"MODIFIED_{datetime.now().strftime('%H%M%S')}"
+            for row_idx, row in enumerate(reader, start=1):
+                for col_idx in planned.get(row_idx, ()):
+                    original_value = row[col_idx]
 
-            data[row_idx][col_idx] = new_value
-            changes_made += 1
-            changes_log.append(f"строка {row_idx}, колонка {col_idx}: {original_value} -> {new_value}")
+                    if original_value and original_value.replace('.', '').replace('-', '').isdigit():
+                        new_value = str(float(original_value) + random.randint(100, 1000))
+                    else:
+                        new_value = f"MODIFIED_{datetime.now().strftime('%H%M%S')}"
 
-        with open(output_file, 'w', newline='', encoding='utf-8') as outfile:
-            writer = csv.writer(outfile)
-            writer.writerows(data)
+                    row[col_idx] = new_value
+                    changes_made += 1
+                    changes_log.append(f"строка {row_idx}, колонка {col_idx}: {original_value} -> {new_value}")
+                writer.writerow(row)
 
         logger.info(f"Создан модифицированный файл: {output_file}")
         logger.info(f"Внесено изменений: {changes_made}")
@@ -58,19 +67,19 @@ def modify_csv_file(input_file, output_file=None, changes_count=3):
 def import_modified_file(csv_file, target_table):
     """Импорт модифицированного файла"""
     try:
-        from csv_export_import import CSVManager
+        from psycopg2 import sql
+        from csv_export_import import CSVManager, table_identifier
         from config import DB_CONFIG
 
-        manager = CSVManager(DB_CONFIG)
         logger.info(f"Импорт модифицированного файла: {csv_file}")
 
-        if manager.connect():
+        # Очистка и импорт выполняются через одно соединение
+        with CSVManager(DB_CONFIG) as manager:
             with manager.connection.cursor() as cursor:
-                cursor.execute(f"TRUNCATE TABLE {target_table}")
+                cursor.execute(sql.SQL("TRUNCATE TABLE {}").format(table_identifier(target_table)))
                 manager.connection.commit()
-            manager.disconnect()
 
-        success = manager.import_from_csv(csv_file, target_table)
+            success = manager.import_from_csv(csv_file, target_table)
 
         if success:
             logger.info("Модифицированные данные успешно импортированы")
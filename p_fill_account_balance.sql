@@ -2,75 +2,77 @@ CREATE OR REPLACE PROCEDURE ds.p_fill_account_balance(in_date IN DATE)
 LANGUAGE PLPGSQL
 AS $$
   DECLARE
-  rec RECORD;
   l_account_cnt INTEGER = 0;
   l_start_time TIMESTAMP = LOCALTIMESTAMP;
-  l_prev_balance_rec RECORD;
-  l_turnover_rec RECORD;
+  l_account_rec RECORD;
 BEGIN
   DELETE FROM DM.DM_ACCOUNT_BALANCE_F WHERE on_date = in_date;
 
   IF in_date = '2017-12-31' THEN
     INSERT INTO DM.DM_ACCOUNT_BALANCE_F(on_date, account_rk, balance_out, balance_out_rub)
-    SELECT b.on_date, b.account_rk, b.balance_out, ROUND((b.balance_out * ds.f_getrate(b.currency_rk, b.on_date))::numeric, 2)
+    SELECT b.on_date, b.account_rk, b.balance_out,
+      ROUND((b.balance_out * COALESCE(rc.reduced_cource, ds.f_getrate(b.currency_rk, b.on_date)))::numeric, 2)
     FROM DS.FT_BALANCE_F b JOIN DS.MD_ACCOUNT_D a ON b.account_rk = a.account_rk
+    LEFT JOIN DS.MD_EXCHANGE_RATE_CALENDAR rc ON rc.currency_rk = b.currency_rk AND rc.on_date = b.on_date
     WHERE b.on_date = in_date;
   ELSE
-    FOR rec IN
-      SELECT account_rk, char_type
-      FROM DS.MD_ACCOUNT_D
-      WHERE in_date BETWEEN data_actual_date AND data_actual_end_date
-      ORDER BY 1
-    LOOP
-      --условие: баланс за предыдущий день должен уже быть
-      SELECT balance_out, balance_out_rub
-      INTO l_prev_balance_rec
-      FROM DM.DM_ACCOUNT_BALANCE_F
-      WHERE on_date = in_date - INTERVAL '1' DAY
-      AND account_rk = rec.account_rk;
-      IF l_prev_balance_rec.balance_out IS NULL THEN
-        RAISE EXCEPTION 'There is no balance for account_rk = % and on_date = %', rec.account_rk, in_date - INTERVAL '1' DAY;
-      END IF;
-      --turnover для in_date
-      SELECT
+    --условие: баланс за предыдущий день должен уже быть
+    SELECT a.account_rk
+    INTO l_account_rec
+    FROM DS.MD_ACCOUNT_D a
+    LEFT JOIN DM.DM_ACCOUNT_BALANCE_F p ON p.account_rk = a.account_rk AND p.on_date = in_date - 1
+    WHERE in_date BETWEEN a.data_actual_date AND a.data_actual_end_date
+    AND p.balance_out IS NULL
+    ORDER BY 1
+    LIMIT 1;
+    IF FOUND THEN
+      RAISE EXCEPTION 'There is no balance for account_rk = % and on_date = %', l_account_rec.account_rk, in_date - INTERVAL '1' DAY;
+    END IF;
+
+    SELECT account_rk, char_type
+    INTO l_account_rec
+    FROM DS.MD_ACCOUNT_D
+    WHERE in_date BETWEEN data_actual_date AND data_actual_end_date
+    AND char_type NOT IN ('А', 'П')
+    ORDER BY 1
+    LIMIT 1;
+    IF FOUND THEN
+      RAISE EXCEPTION 'error char_type = "%" for account_rk = %?', l_account_rec.char_type, l_account_rec.account_rk;
+    END IF;
+
+    --остаток = остаток за предыдущий день +/- обороты за in_date, одним запросом по всем счетам
+    INSERT INTO DM.DM_ACCOUNT_BALANCE_F(on_date, account_rk, balance_out, balance_out_rub)
+    SELECT
+      in_date,
+      a.account_rk,
+      CASE a.char_type
+        WHEN 'А' THEN ROUND((p.balance_out + COALESCE(t.debet_amount, 0) - COALESCE(t.credit_amount, 0))::numeric, 2)
+        ELSE ROUND((p.balance_out - COALESCE(t.debet_amount, 0) + COALESCE(t.credit_amount, 0))::numeric, 2)
+      END,
+      CASE a.char_type
+        WHEN 'А' THEN ROUND((p.balance_out_rub + COALESCE(t.debet_amount_rub, 0) - COALESCE(t.credit_amount_rub, 0))::numeric, 2)
+        ELSE ROUND((p.balance_out_rub - COALESCE(t.debet_amount_rub, 0) + COALESCE(t.credit_amount_rub, 0))::numeric, 2)
+      END
+    FROM DS.MD_ACCOUNT_D a
+    JOIN DM.DM_ACCOUNT_BALANCE_F p ON p.account_rk = a.account_rk AND p.on_date = in_date - 1
+    LEFT JOIN (
+      SELECT DISTINCT ON (account_rk)
         account_rk,
         debet_amount,
         debet_amount_rub,
         credit_amount,
         credit_amount_rub
-      INTO l_turnover_rec
       FROM DM.DM_ACCOUNT_TURNOVER_F
-      WHERE account_rk = rec.account_rk AND on_date = in_date;
-
-      l_turnover_rec.debet_amount = COALESCE(l_turnover_rec.debet_amount, 0);
-      l_turnover_rec.debet_amount_rub = COALESCE(l_turnover_rec.debet_amount_rub, 0);
-      l_turnover_rec.credit_amount = COALESCE(l_turnover_rec.credit_amount, 0);
-      l_turnover_rec.credit_amount_rub = COALESCE(l_turnover_rec.credit_amount_rub, 0);
-
-      IF rec.char_type = 'А' THEN
-         INSERT INTO DM.DM_ACCOUNT_BALANCE_F(on_date, account_rk, balance_out, balance_out_rub)
-         VALUES (
-           in_date,
-           rec.account_rk,
-           ROUND((l_prev_balance_rec.balance_out + l_turnover_rec.debet_amount - l_turnover_rec.credit_amount)::numeric, 2),
-           ROUND((l_prev_balance_rec.balance_out_rub + l_turnover_rec.debet_amount_rub - l_turnover_rec.credit_amount_rub)::numeric, 2)
-         );
-      ELSIF rec.char_type = 'П' THEN
-         INSERT INTO DM.DM_ACCOUNT_BALANCE_F(on_date, account_rk, balance_out, balance_out_rub)
-         VALUES (
-           in_date,
-           rec.account_rk,
-           ROUND((l_prev_balance_rec.balance_out - l_turnover_rec.debet_amount + l_turnover_rec.credit_amount)::numeric, 2),
-           ROUND((l_prev_balance_rec.balance_out_rub - l_turnover_rec.debet_amount_rub + l_turnover_rec.credit_amount_rub)::numeric, 2)
-         );
-      ELSE
-        RAISE EXCEPTION 'error char_type = "%" for account_rk = %?', rec.char_type, rec.account_rk;
-      END IF;
-    END LOOP;
+      WHERE on_date = in_date
+      ORDER BY account_rk
+    ) t ON t.account_rk = a.account_rk
+    WHERE in_date BETWEEN a.data_actual_date AND a.data_actual_end_date
+    ORDER BY a.account_rk;
 
+    GET DIAGNOSTICS l_account_cnt = ROW_COUNT;
   END IF;
   INSERT INTO LOGS.ETL_LOGS(process_name, start_time, end_time, status, rows_processed)
-  VALUES ('P_FILL_ACCOUNT_BALANCE for '||in_date, l_start_time, LOCALTIMESTAMP, 'ok', 0);
+  VALUES ('P_FILL_ACCOUNT_BALANCE for '||in_date, l_start_time, LOCALTIMESTAMP, 'ok', l_account_cnt);
   COMMIT;
 END;
-$$;
\ No newline at end of file
+$$;
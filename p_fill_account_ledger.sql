@@ -0,0 +1,31 @@
+CREATE OR REPLACE PROCEDURE ds.p_fill_account_ledger()
+LANGUAGE PLPGSQL
+AS $$
+  DECLARE
+  l_start_time TIMESTAMP = LOCALTIMESTAMP;
+  l_inserted_cnt INTEGER = 0;
+BEGIN
+  --балансовый счет, глава и признак рублевого счета вычисляются один раз для каждой пары
+  --версия счета - версия балансового счета, как в прежнем CTE account_info.
+  --Период актуальности строки - пересечение периодов обеих версий
+  DELETE FROM DS.MD_ACCOUNT_LEDGER;
+
+  INSERT INTO DS.MD_ACCOUNT_LEDGER (account_rk, data_actual_date, data_actual_end_date,
+                                    ledger_account, chapter, characteristic, is_rub)
+  SELECT
+    a.account_rk,
+    GREATEST(a.data_actual_date, la.start_date),
+    LEAST(a.data_actual_end_date, la.end_date),
+    SUBSTRING(a.account_number FROM 1 FOR 5),
+    la.chapter,
+    a.char_type,
+    CASE WHEN a.currency_code IN ('810', '643') THEN 1 ELSE 0 END
+  FROM DS.MD_ACCOUNT_D a
+  LEFT JOIN DS.MD_LEDGER_ACCOUNT_S la ON SUBSTRING(a.account_number FROM 1 FOR 5)::INTEGER = la.ledger_account;
+  GET DIAGNOSTICS l_inserted_cnt = ROW_COUNT;
+
+  --вызывается в транзакции загрузки справочников, поэтому без COMMIT
+  INSERT INTO LOGS.ETL_LOGS(process_name, start_time, end_time, status, rows_processed)
+  VALUES ('P_FILL_ACCOUNT_LEDGER', l_start_time, LOCALTIMESTAMP, 'ok', l_inserted_cnt);
+END;
+$$;
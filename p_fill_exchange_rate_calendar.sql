@@ -0,0 +1,41 @@
+CREATE OR REPLACE PROCEDURE ds.p_fill_exchange_rate_calendar(in_date_from IN DATE DEFAULT NULL)
+LANGUAGE PLPGSQL
+AS $$
+  DECLARE
+  l_start_time TIMESTAMP = LOCALTIMESTAMP;
+  l_date_from DATE;
+  l_date_to DATE;
+  l_changed_cnt INTEGER = 0;
+  l_deleted_cnt INTEGER = 0;
+BEGIN
+  --период календаря: от первого курса до текущей даты (или последнего курса, если он позже)
+  SELECT MIN(data_actual_date), GREATEST(CURRENT_DATE, MAX(data_actual_date))
+  INTO l_date_from, l_date_to
+  FROM DS.MD_EXCHANGE_RATE_D;
+  l_date_from = GREATEST(l_date_from, in_date_from);
+
+  --курс считается один раз на валюту и день, записываются только изменившиеся строки
+  INSERT INTO DS.MD_EXCHANGE_RATE_CALENDAR AS c (currency_rk, on_date, reduced_cource)
+  SELECT cur.currency_rk, d.on_date::DATE, ds.f_getrate(cur.currency_rk, d.on_date::DATE)
+  FROM (
+    SELECT currency_rk FROM DS.MD_ACCOUNT_D
+    UNION
+    SELECT currency_rk FROM DS.MD_CURRENCY_D
+    UNION
+    SELECT currency_rk FROM DS.MD_EXCHANGE_RATE_D
+  ) cur
+  CROSS JOIN generate_series(l_date_from, l_date_to, INTERVAL '1' DAY) d(on_date)
+  ON CONFLICT (currency_rk, on_date) DO UPDATE SET reduced_cource = EXCLUDED.reduced_cource
+  WHERE c.reduced_cource IS DISTINCT FROM EXCLUDED.reduced_cource;
+  GET DIAGNOSTICS l_changed_cnt = ROW_COUNT;
+
+  DELETE FROM DS.MD_EXCHANGE_RATE_CALENDAR
+  WHERE on_date > l_date_to
+  OR (in_date_from IS NULL AND (l_date_from IS NULL OR on_date < l_date_from));
+  GET DIAGNOSTICS l_deleted_cnt = ROW_COUNT;
+
+  --вызывается в транзакции загрузки курсов, поэтому без COMMIT
+  INSERT INTO LOGS.ETL_LOGS(process_name, start_time, end_time, status, rows_processed)
+  VALUES ('P_FILL_EXCHANGE_RATE_CALENDAR', l_start_time, LOCALTIMESTAMP, 'ok', l_changed_cnt + l_deleted_cnt);
+END;
+$$;
@@ -0,0 +1,177 @@
+import csv
+import argparse
+import psycopg2
+from psycopg2 import sql
+from config import DB_CONFIG, setup_logging
+from csv_export_import import table_identifier
+
+logger = setup_logging()
+
+RECONCILE_KEYS = ('from_date', 'to_date', 'ledger_account')
+RECONCILE_BUCKETS = 1024
+REPORT_SAMPLE_SIZE = 20
+
+# Временная таблица, в которую загружается CSV для сверки
+CSV_TABLE = 'reconcile_csv'
+
+
+def table_columns(cursor, table_name):
+    cursor.execute(sql.SQL("SELECT * FROM {} LIMIT 0").format(table_identifier(table_name)))
+    return [column[0] for column in cursor.description]
+
+
+def hashed_rows(table_name, columns, keys, buckets):
+    # Номер корзины зависит только от ключа, хеш строки - от всех сравниваемых колонок
+    return sql.SQL("""
+        SELECT (hashtext(ROW({keys})::text) & 2147483647) % {buckets} AS bucket,
+               md5(ROW({columns})::text) AS row_hash,
+               {columns}
+        FROM {table}
+    """).format(
+        keys=sql.SQL(', ').join(map(sql.Identifier, keys)),
+        columns=sql.SQL(', ').join(map(sql.Identifier, columns)),
+        buckets=sql.Literal(buckets),
+        table=table_identifier(table_name)
+    )
+
+
+def bucket_hashes(cursor, table_name, columns, keys, buckets):
+    cursor.execute(sql.SQL("""
+        SELECT bucket, COUNT(*), md5(string_agg(row_hash, '' ORDER BY row_hash))
+        FROM ({rows}) t
+        GROUP BY bucket
+    """).format(rows=hashed_rows(table_name, columns, keys, buckets)))
+    return {bucket: (count, digest) for bucket, count, digest in cursor.fetchall()}
+
+
+def bucket_rows(cursor, table_name, columns, keys, buckets, selected):
+    cursor.execute(sql.SQL("SELECT * FROM ({rows}) t WHERE bucket = ANY(%s)").format(
+        rows=hashed_rows(table_name, columns, keys, buckets)
+    ), (list(selected),))
+    key_positions = [columns.index(key) for key in keys]
+    rows = {}
+    for _, row_hash, *values in cursor:
+        key = tuple(values[pos] for pos in key_positions)
+        rows.setdefault(key, []).append((row_hash, tuple(values)))
+    return rows
+
+
+def diff_rows(source_rows, target_rows):
+    added, removed, changed = [], [], []
+    for key in source_rows.keys() | target_rows.keys():
+        source = source_rows.get(key, [])
+        target = target_rows.get(key, [])
+        common = {row_hash for row_hash, _ in source} & {row_hash for row_hash, _ in target}
+        source = [values for row_hash, values in source if row_hash not in common]
+        target = [values for row_hash, values in target if row_hash not in common]
+        # Строки с одинаковым ключом сопоставляются попарно, остаток считается удаленным/добавленным
+        changed.extend(zip(source, target))
+        removed.extend(source[len(target):])
+        added.extend(target[len(source):])
+    return added, removed, changed
+
+
+def reconcile_tables(conn, source_table, target_table, keys=RECONCILE_KEYS,
+                     buckets=RECONCILE_BUCKETS):
+    with conn.cursor() as cursor:
+        target_columns = set(table_columns(cursor, target_table))
+        columns = [col for col in table_columns(cursor, source_table) if col in target_columns]
+        missing_keys = set(keys) - set(columns)
+        if missing_keys:
+            raise ValueError(f"Ключевые колонки отсутствуют в сравниваемых таблицах: {missing_keys}")
+
+        source_buckets = bucket_hashes(cursor, source_table, columns, keys, buckets)
+        target_buckets = bucket_hashes(cursor, target_table, columns, keys, buckets)
+        differing = {bucket for bucket in source_buckets.keys() | target_buckets.keys()
+                     if source_buckets.get(bucket) != target_buckets.get(bucket)}
+        logger.info(f"Сверка {source_table} и {target_table}: "
+                    f"различаются {len(differing)} из {buckets} корзин")
+
+        if not differing:
+            return {'columns': columns, 'keys': list(keys), 'buckets': 0,
+                    'added': [], 'removed': [], 'changed': []}
+
+        # Построчно читаются только корзины с расхождениями
+        source_rows = bucket_rows(cursor, source_table, columns, keys, buckets, differing)
+        target_rows = bucket_rows(cursor, target_table, columns, keys, buckets, differing)
+
+    added, removed, changed = diff_rows(source_rows, target_rows)
+    return {'columns': columns, 'keys': list(keys), 'buckets': len(differing),
+            'added': added, 'removed': removed, 'changed': changed}
+
+
+def load_csv_table(conn, csv_file, like_table):
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {}) ON COMMIT DROP").format(
+            sql.Identifier(CSV_TABLE), table_identifier(like_table)
+        ))
+        with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+            header = next(csv.reader(f))
+            f.seek(0)
+            cursor.copy_expert(sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, HEADER true)").format(
+                sql.Identifier(CSV_TABLE), sql.SQL(', ').join(map(sql.Identifier, header))
+            ), f)
+        logger.info(f"Файл {csv_file} загружен во временную таблицу: {cursor.rowcount} строк")
+    return CSV_TABLE
+
+
+def format_row(columns, values):
+    return ', '.join(f"{col}={value}" for col, value in zip(columns, values))
+
+
+def format_change(columns, keys, source, target):
+    key = format_row(keys, [source[columns.index(k)] for k in keys])
+    changes = ', '.join(f"{col}: {old} -> {new}"
+                        for col, old, new in zip(columns, source, target) if old != new)
+    return f"{key}: {changes}"
+
+
+def log_report(report, sample_size=REPORT_SAMPLE_SIZE):
+    columns, keys = report['columns'], report['keys']
+    logger.info(f"Добавлено строк: {len(report['added'])}, удалено: {len(report['removed'])}, "
+                f"изменено: {len(report['changed'])}")
+    for values in report['added'][:sample_size]:
+        logger.info(f"+ {format_row(columns, values)}")
+    for values in report['removed'][:sample_size]:
+        logger.info(f"- {format_row(columns, values)}")
+    for source, target in report['changed'][:sample_size]:
+        logger.info(f"~ {format_change(columns, keys, source, target)}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Сверка двух таблиц или таблицы и CSV файла')
+    parser.add_argument('source_table', help='эталонная таблица, например dm.dm_f101_round_f')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--table', help='сравниваемая таблица')
+    target.add_argument('--csv', help='сравниваемый CSV файл с заголовком')
+    parser.add_argument('--keys', nargs='+', default=list(RECONCILE_KEYS),
+                        help='ключевые колонки для сопоставления строк')
+    parser.add_argument('--buckets', type=int, default=RECONCILE_BUCKETS,
+                        help='количество корзин для сравнения хешей')
+    parser.add_argument('--sample', type=int, default=REPORT_SAMPLE_SIZE,
+                        help='сколько строк каждого вида выводить в отчете')
+    args = parser.parse_args(argv)
+    if args.buckets < 1:
+        parser.error('--buckets должен быть не меньше 1')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        target_table = args.table or load_csv_table(conn, args.csv, args.source_table)
+        report = reconcile_tables(conn, args.source_table, target_table, args.keys, args.buckets)
+        conn.rollback()
+    finally:
+        conn.close()
+    log_report(report, args.sample)
+    return report
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        logger.critical(f"Завершение работы с ошибкой: {str(e)}")
+        exit(1)
@@ -0,0 +1,110 @@
+import csv
+
+import pytest
+
+import etl
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'name'])
+        writer.writerows(rows)
+
+
+def open_like_load_table(path, block_size, byte_offset=None, new_reader=True):
+    # Та же последовательность, что и в load_table: начало файла, заголовок, переход к смещению
+    f = etl.TrackedSource(path, block_size=block_size)
+    etl.read_head(f)
+    f.seek(0)
+    reader = csv.reader(f)
+    assert next(reader) == ['id', 'name']
+    if byte_offset is not None:
+        f.seek(byte_offset)
+        if new_reader:
+            reader = csv.reader(f)
+    return f, reader
+
+
+@pytest.mark.parametrize('block_size', [etl.CHECKPOINT_BLOCK_SIZE, 16])
+@pytest.mark.parametrize('new_reader', [True, False])
+def test_resume_from_checkpoint_yields_remaining_rows(tmp_path, block_size, new_reader):
+    path = tmp_path / 'source.csv'
+    rows = [[str(i), f'имя {i}' if i % 3 else f'name {i}'] for i in range(1, 21)]
+    write_csv(path, rows)
+
+    f, reader = open_like_load_table(path, block_size)
+    with f:
+        loaded = [next(reader) for _ in range(10)]
+        byte_offset = f.offset
+    assert loaded == rows[:10]
+
+    f, reader = open_like_load_table(path, block_size, byte_offset, new_reader)
+    with f:
+        assert f.offset == byte_offset
+        resumed = [next(reader) for _ in range(5)]
+        middle_offset = f.offset
+        resumed.extend(reader)
+        assert f.offset == path.stat().st_size
+    assert resumed == rows[10:]
+
+    f, reader = open_like_load_table(path, block_size, middle_offset, new_reader)
+    with f:
+        assert list(reader) == rows[15:]
+
+
+POSTING_INFO = {
+    'columns': ['oper_date', 'credit_account_rk', 'debet_account_rk', 'credit_amount', 'debet_amount'],
+    'types': ['date', 'numeric', 'numeric', 'float', 'float']
+}
+
+
+@pytest.mark.parametrize('row', [
+    ['2024-01-31', '13560', '7', '1e-400', '5'],
+    ['31.01.2024', '13560', '1.5', '1E400', '0.1'],
+    ['0000-01-01', '1', '2', '3.25', '-4e-5'],
+    ['2024-02-30', '1', '2', '3', '4'],
+    ['', '1', '', '', '1.5e300'],
+    ['2024-01-31', '--5', '1_000', 'nan', '１２'],
+    ['2024-01-31', '99999999999999999999', '-0', '0e-400', '.5'],
+])
+def test_numpy_engine_matches_row_engine(row):
+    np = pytest.importorskip('numpy')
+    assert np is etl.np
+    fieldnames = POSTING_INFO['columns']
+    chunk = [['2024-01-30', '1', '2', '0.5', '12345.678'], row]
+    expected = etl.build_chunk_converter('row', POSTING_INFO, fieldnames, fieldnames,
+                                         'copy', etl.RowErrors())(chunk, 1)
+    actual = etl.build_chunk_converter('numpy', POSTING_INFO, fieldnames, fieldnames,
+                                       'copy', etl.RowErrors())(chunk, 1)
+    # Числа могут передаваться исходным текстом, сравниваются разобранные значения
+    assert list(map(parse_copy_line, actual)) == list(map(parse_copy_line, expected))
+
+
+def parse_copy_line(line):
+    values = line.split('\t')
+    return values[:1] + [value if value == etl.COPY_NULL else repr(float(value)) for value in values[1:]]
+
+
+def test_numpy_engine_converts_clean_chunk_without_fallback():
+    pytest.importorskip('numpy')
+    fieldnames = POSTING_INFO['columns']
+    chunk = [['30.01.2024', '1', '2', '0.5', '12345.678'], ['31.01.2024', '-3', '4.25', '', '1e5'],
+             ['29.02.2024', '', '+5', '-0.0', '7'], ['null', '6', '7', '8', '9']]
+    errors = etl.RowErrors()
+    expected = etl.build_chunk_converter('row', POSTING_INFO, fieldnames, fieldnames, 'copy')(chunk, 1)
+    actual = etl.build_chunk_converter('numpy', POSTING_INFO, fieldnames, fieldnames,
+                                       'copy', errors)(chunk, 1)
+    assert errors.fallbacks == 0
+    assert list(map(parse_copy_line, actual)) == list(map(parse_copy_line, expected))
+
+
+def test_manifest_dialect_restores_detected_format(tmp_path):
+    path = tmp_path / 'source.csv'
+    path.write_text("id|name\n1|'a|b'\n2|' c'\n", encoding='utf-8')
+    with open(path, encoding='utf-8') as f:
+        head = etl.read_head(f)
+    detected, has_header = etl.detect_csv_format(str(path), head)
+    restored, restored_header = etl.pinned_dialect(etl.manifest_dialect(detected, has_header))
+    assert restored_header == has_header
+    assert list(csv.reader(head, dialect=restored)) == list(csv.reader(head, dialect=detected))